@@ -4,6 +4,84 @@ from langgraph.graph import END
 from typing import Literal
 
 from components.model import State, AgentConfig
+from components.prompt_budget import format_token_list
+from components.llm_cache import LLMResponseCache
+
+SYSTEM_MESSAGES = {
+    "putToken": """
+            # Smart contract agent
+            You are a smart contract agent that must call the put_token function to mint an NFT.
+            
+            **IMPORTANT**: You MUST call the put_token tool with the following parameters:
+            - to_address: The wallet address for the NFT. Select the issuing address from the list of currently issued NFTs.
+            - token_name: The name of the NFT to mint. Select the NFT name to be issued based on user role.
+            
+            Do not just provide information - you must execute the put_token function.
+            """,
+    "reporting": """
+            # Smart contract agent
+            You are a smart contract agent that must call the reporting function to generate a final report.
+            
+            **IMPORTANT**: You MUST call the reporting tool to generate the final report.
+            """,
+}
+DEFAULT_SYSTEM_MESSAGE = """
+            # Smart contract agent
+            You are calling smart contract functions to support users as a smart contract agent.
+            """
+
+# The index of the only tool the model may call in each status
+STATUS_TOOLS = {"putToken": 0, "reporting": 2}
+
+def build_prompt_template(system_message: str) -> ChatPromptTemplate:
+    """
+    Build the prompt template of the agent with the system message.
+    """
+    return ChatPromptTemplate.from_messages([
+        ('system', system_message),
+        (
+            "system",
+            """
+            # List of currently issued tokens
+            {token_list}
+            """
+        ),
+        (
+            "user",
+            """
+            # My information
+            - Name: {name}
+            - Role: {role}
+            - Wallet address: {address}
+            """
+        )
+    ])
+
+# The templates are compiled once when the module is loaded
+PROMPT_TEMPLATES = {status: build_prompt_template(system_message) for status, system_message in SYSTEM_MESSAGES.items()}
+DEFAULT_PROMPT_TEMPLATE = build_prompt_template(DEFAULT_SYSTEM_MESSAGE)
+REASON_PROMPT_TEMPLATE = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        """
+        # Smart contract agent
+        You are a smart contract agent that issued an NFT as a reward.
+        Write the reason why the NFT was issued to the recipient in one or two sentences in Japanese, based on your role.
+        Answer with the reason only.
+        """
+    ),
+    (
+        "user",
+        """
+        # My information
+        - Name: {name}
+        - Role: {role}
+        # Issued token
+        - Token name: {token_name}
+        - Recipient address: {owner}
+        """
+    )
+])
 
 class ContractAgent:
 
@@ -12,6 +90,10 @@ class ContractAgent:
         self.tools = config.tools
         self.name = config.name
         self.roll = config.roll
+        self.token_budget = config.token_budget
+        self.tokenizer_model = config.tokenizer_model
+        self.reporting_mode = config.reporting_mode
+        self.generate_reason = config.generate_reason
 
         # Set up the callback handler
         if handler is None:
@@ -22,6 +104,20 @@ class ContractAgent:
         # Set my wallet address
         self.address = self.tools[3].invoke({"address": "0x00"})
 
+        # Fill the information of the agent into the templates once
+        self.prompt_templates = {
+            status: template.partial(name=self.name, role=self.roll, address=self.address)
+            for status, template in PROMPT_TEMPLATES.items()
+        }
+        self.default_prompt_template = DEFAULT_PROMPT_TEMPLATE.partial(name=self.name, role=self.roll, address=self.address)
+        self.reason_prompt_template = REASON_PROMPT_TEMPLATE.partial(name=self.name, role=self.roll)
+
+        # The models with tools are bound on the first use of each status and reused
+        self.bound_models = {}
+
+        # Reuse the responses to the same prompts across runs
+        self.llm_cache = LLMResponseCache(config.llm_cache_path, config.llm_cache_size) if config.llm_cache else None
+
     @staticmethod
     def route(state: State) -> Literal["putToken", "reporting"]:
         """
@@ -36,107 +132,217 @@ class ContractAgent:
         """
         Initialize the prompt with agent state.
         """
-        token_list = "\n".join(
-            f"- トークンID: {token.token_id}, トークン名: {token.token_name}, 転送元アドレス: {token.from_address}, 転送先アドレス: {token.to_address}"
-            for token in state.tokens
-        ) if state.tokens else "発行されたトークンはありません。"
+        # Keep the most relevant tokens within the budget and summarize the others
+        token_list = format_token_list(state.tokens, self.address, self.token_budget, self.tokenizer_model)
 
-        if state.status == "putToken":
-            system_message = """
-            # Smart contract agent
-            You are a smart contract agent that must call the put_token function to mint an NFT.
-            
-            **IMPORTANT**: You MUST call the put_token tool with the following parameters:
-            - to_address: The wallet address for the NFT. Select the issuing address from the list of currently issued NFTs.
-            - token_name: The name of the NFT to mint. Select the NFT name to be issued based on user role.
-            
-            Do not just provide information - you must execute the put_token function.
-            """
-        elif state.status == "reporting":
-            system_message = """
-            # Smart contract agent
-            You are a smart contract agent that must call the reporting function to generate a final report.
-            
-            **IMPORTANT**: You MUST call the reporting tool to generate the final report.
-            """
-        else:
-            system_message = """
-            # Smart contract agent
-            You are calling smart contract functions to support users as a smart contract agent.
-            """
+        prompt_template = self.prompt_templates.get(state.status, self.default_prompt_template)
+        return prompt_template.format_messages(token_list=token_list)
 
-        # Define the prompt
-        prompt_template = ChatPromptTemplate.from_messages([
-            ('system', system_message),
-            (
-                "system",
-                """
-                # List of currently issued tokens
-                {token_list}
-                """
-            ),
-            (
-                "user",
-                """
-                # My information
-                - Name: {name}
-                - Role: {role}
-                - Wallet address: {address}
-                """
-            )
-        ])
-        prompt = prompt_template.format_messages(
-            token_list=token_list,
-            name=self.name,
-            role=self.roll,
-            address=self.address
-        )
-        return prompt
+    def init_reason_prompt(self, state: State):
+        """
+        Initialize the prompt to write the reason why the token was issued.
+        """
+        return self.reason_prompt_template.format_messages(token_name=state.token_name, owner=state.address)
+
+    def init_report(self, state: State) -> dict:
+        """
+        Build the arguments of the reporting tool from the state without the model.
+        """
+        if state.token_name:
+            token = f"トークン名: {state.token_name}"
+            if state.token_id != -1:
+                token += f", トークンID: {state.token_id}"
+            reason = f"{self.name}の役割「{self.roll}」に基づいて、送信先アドレスの貢献を評価して発行しました。"
+        else:
+            token = "発行するトークンはありません。"
+            reason = "発行するトークンがないため、NFTを発行していません。"
+        return {
+            "token_list": format_token_list(state.tokens, self.address, self.token_budget, self.tokenizer_model),
+            "token": token,
+            "reason": reason,
+            "owner": state.address or "なし",
+        }
     
-    def execute(self, prompt):
+    def get_bound_model(self, status: str):
+        """
+        Get the model with the tools of the status.
+        In putToken and reporting, only the tool of the status is bound and the model is forced to call it.
+        In the other statuses, all the tools are bound.
+        """
+        if status not in self.bound_models:
+            if status in STATUS_TOOLS:
+                tool = self.tools[STATUS_TOOLS[status]]
+                self.bound_models[status] = self.model.bind_tools([tool], tool_choice=tool.name)
+            else:
+                self.bound_models[status] = self.model.bind_tools(self.tools)
+        return self.bound_models[status]
+
+    def execute(self, prompt, status: str | None = None):
         """
         Execute the agent with the given prompt and tools.
         """
-        # Set  model with tools
-        model_with_tool = self.model.bind_tools(self.tools)
+        # Get the model with the tools of the status
+        model_with_tool = self.get_bound_model(status)
+
+        # Return the cached response to the same prompt
+        key, output = self.get_cached_response(model_with_tool, prompt)
+        if output is not None:
+            return output
 
         # Invoke the model with the prompt
         if self.config["callbacks"][0] == None:
             output = model_with_tool.invoke(prompt)
         else:
             output = model_with_tool.invoke(prompt, config=self.config)
+        self.put_cached_response(key, output)
         return output
 
+    async def aexecute(self, prompt, status: str | None = None):
+        """
+        Execute the agent with the given prompt and tools on the event loop.
+        """
+        model_with_tool = self.get_bound_model(status)
+        key, output = self.get_cached_response(model_with_tool, prompt)
+        if output is not None:
+            return output
+        if self.config["callbacks"][0] == None:
+            output = await model_with_tool.ainvoke(prompt)
+        else:
+            output = await model_with_tool.ainvoke(prompt, config=self.config)
+        self.put_cached_response(key, output)
+        return output
+
+    def get_cached_response(self, model_with_tool, prompt):
+        """
+        Get the key of the prompt and the cached response to it, or None if it is not cached or the cache is bypassed.
+        """
+        if self.llm_cache is None:
+            return None, None
+        key = self.llm_cache.make_key(self.model, getattr(model_with_tool, "kwargs", {}), prompt)
+        return key, self.llm_cache.get(key)
+
+    def put_cached_response(self, key, output) -> None:
+        """
+        Cache the response to the prompt.
+        The responses without tool calls are not cached, so that a retry asks the model again.
+        """
+        if key is not None and len(getattr(output, "tool_calls", [])) > 0:
+            self.llm_cache.put(key, output)
+
+    def generate(self, prompt) -> str:
+        """
+        Generate a text with the given prompt without tools.
+        """
+        if self.config["callbacks"][0] == None:
+            output = self.model.invoke(prompt)
+        else:
+            output = self.model.invoke(prompt, config=self.config)
+        return output.content
+
+    async def agenerate(self, prompt) -> str:
+        """
+        Generate a text with the given prompt without tools on the event loop.
+        """
+        if self.config["callbacks"][0] == None:
+            output = await self.model.ainvoke(prompt)
+        else:
+            output = await self.model.ainvoke(prompt, config=self.config)
+        return output.content
+
     def get_agent(self, state: State) -> State:
         """
         Decide the next action based on the current state.
         """
+        steps = self.steps(state)
+        try:
+            call = next(steps)
+            while True:
+                if call[0] == "model":
+                    result = self.execute(call[2], call[1])
+                elif call[0] == "text":
+                    result = self.generate(call[1])
+                else:
+                    result = call[1].invoke(call[2])
+                call = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+    async def aget_agent(self, state: State) -> State:
+        """
+        Decide the next action based on the current state, awaiting the model and the tools.
+        Several agent runs can overlap their model calls and chain requests on one event loop.
+        """
+        steps = self.steps(state)
+        try:
+            call = next(steps)
+            while True:
+                if call[0] == "model":
+                    result = await self.aexecute(call[2], call[1])
+                elif call[0] == "text":
+                    result = await self.agenerate(call[1])
+                else:
+                    result = await call[1].ainvoke(call[2])
+                call = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+    def steps(self, state: State):
+        """
+        Run the step of the current state.
+        The model and the tools are not called here, each call is yielded and its result is sent back,
+        so that get_agent and aget_agent share the same steps.
+        - ("model", status, prompt): the model with the tools of the status
+        - ("text", prompt): the text generated by the model without the tools
+        - ("tool", tool, args): the tool
+        """
         new_message = ""
         new_tokens = state.tokens
         new_address = state.address
         new_token_name = state.token_name
+        new_token_id = state.token_id
+        new_tracking_id = state.tracking_id
         new_status = state.status
-        prompt = self.init_prompt(state)
 
         if(state.status == "fetchTokens"):
-            new_tokens = self.tools[1].invoke("0x00")
+            # Fetch only the history of the address if it is set
+            new_tokens = yield ("tool", self.tools[1], {"address": state.address or None})
             new_message = f"取引履歴が取得されました。トークンの数: {len(new_tokens)}"
             if len(new_tokens) > 0:
                 new_status = "putToken"
             else:   
                 new_status = "reporting"
         elif(state.status == "putToken"):
-            output = self.execute(prompt)
+            output = yield ("model", state.status, self.init_prompt(state))
             for tool_call in output.tool_calls:
-                token_id = self.tools[0].invoke(tool_call["args"])
-                new_message = f"NFTが発行されました。\n- トークンID: {token_id}\n- トークン名: {state.token_name}\n- 送信先アドレス: {state.address}"
+                # Only mint the single reward of this step, e.g. not a batch from put_tokens
+                if tool_call["name"] != self.tools[0].name:
+                    continue
+                token_id = yield ("tool", self.tools[0], tool_call["args"])
+                if isinstance(token_id, str):
+                    # The NFT was queued in the outbox and is minted in the background
+                    new_tracking_id = token_id
+                    new_message = f"NFTの発行を受け付けました。\n- 追跡ID: {token_id}\n- トークン名: {state.token_name}\n- 送信先アドレス: {state.address}"
+                else:
+                    new_token_id = token_id
+                    new_message = f"NFTが発行されました。\n- トークンID: {token_id}\n- トークン名: {state.token_name}\n- 送信先アドレス: {state.address}"
                 new_address = tool_call["args"]["to_address"]
                 new_token_name = tool_call["args"]["token_name"]
             new_status = "reporting"
+        elif(state.status == "reporting" and self.reporting_mode == "direct"):
+            # Build the report from the state, only the reason may be written by the model
+            report = self.init_report(state)
+            if self.generate_reason and state.token_name:
+                report["reason"] = yield ("text", self.init_reason_prompt(state))
+            new_message = yield ("tool", self.tools[2], report)
+            new_message += self.format_mint_status((yield from self.get_mint_status(state)))
+            new_status = END
         elif(state.status == "reporting"):
-            output = self.execute(prompt)
+            output = yield ("model", state.status, self.init_prompt(state))
             for tool_call in output.tool_calls:
-                new_message = self.tools[2].invoke(tool_call["args"])
+                if tool_call["name"] != self.tools[2].name:
+                    continue
+                new_message = yield ("tool", self.tools[2], tool_call["args"])
+            new_message += self.format_mint_status((yield from self.get_mint_status(state)))
             new_status = END
 
         # Return the state with updated messages and status
@@ -145,5 +351,24 @@ class ContractAgent:
             tokens=new_tokens,
             address=new_address,
             token_name=new_token_name,
+            token_id=new_token_id,
+            tracking_id=new_tracking_id,
             status=new_status,
         )
+
+    def get_mint_status(self, state: State):
+        """
+        Get the status of the NFT queued in the outbox, or None if it was not queued.
+        """
+        if not state.tracking_id:
+            return None
+        return (yield ("tool", self.tools[5], {"tracking_id": state.tracking_id}))
+
+    @staticmethod
+    def format_mint_status(mint_status) -> str:
+        """
+        Format the status of the NFT queued in the outbox for the report.
+        """
+        if mint_status is None:
+            return ""
+        return f"発行状況:\n {mint_status.status} (トークンID: {mint_status.token_id})\n"
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+def describe_model(model) -> str:
+    """
+    Describe the model and its parameters, e.g. the deployment and the temperature, for the cache key.
+    """
+    if hasattr(model, "_get_llm_string"):
+        return model._get_llm_string()
+    return f"{type(model).__module__}.{type(model).__qualname__}"
+
+class LLMResponseCache:
+    """
+    Exact-match cache of the responses of the model persisted in SQLite.
+    The key is a hash of the model, the bound tools and the formatted messages,
+    and the least recently used responses over max_size are evicted.
+    """
+
+    def __init__(self, path: str, max_size: int = 1000):
+        if path != ":memory:" and os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    message TEXT NOT NULL,
+                    used_at INTEGER NOT NULL
+                )
+                """
+            )
+        self.size, clock = self.conn.execute("SELECT COUNT(*), MAX(used_at) FROM responses").fetchone()
+        self.clock = clock or 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def make_key(model, bound_kwargs: Dict, messages: List[BaseMessage]) -> str:
+        """
+        Make the key of the request from the model, the keyword arguments bound to it (the tools and the tool choice) and the messages.
+        """
+        request = {
+            "model": describe_model(model),
+            "kwargs": bound_kwargs,
+            "messages": messages_to_dict(messages),
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> BaseMessage | None:
+        """
+        Get the cached response and mark it as recently used, or None if it is not cached.
+        """
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT message FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.clock += 1
+            self.conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (self.clock, key))
+        return messages_from_dict([json.loads(row[0])])[0]
+
+    def put(self, key: str, message: BaseMessage) -> None:
+        """
+        Store the response and evict the least recently used responses over max_size.
+        """
+        data = json.dumps(messages_to_dict([message])[0])
+        with self.lock, self.conn:
+            self.clock += 1
+            cursor = self.conn.execute("UPDATE responses SET message = ?, used_at = ? WHERE key = ?", (data, self.clock, key))
+            if cursor.rowcount == 0:
+                self.conn.execute("INSERT INTO responses (key, message, used_at) VALUES (?, ?, ?)", (key, data, self.clock))
+                self.size += 1
+            if self.size > self.max_size:
+                self.conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used_at LIMIT ?)",
+                    (self.size - self.max_size,),
+                )
+                self.size = self.max_size
+
+    def clear(self) -> None:
+        """
+        Drop all the cached responses.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
+            self.size = 0
@@ -12,13 +12,58 @@ class Token(BaseModel):
     token_id: int
     token_name: str
 
+class Reward(BaseModel):
+    """
+    Reward class to represent a token to be minted in a batch.
+    """
+    to_address: str
+    token_name: str
+
+class MintResult(BaseModel):
+    """
+    MintResult class to represent the result of minting a reward in a batch.
+    The token_id is -1 and the error is set if the reward could not be minted.
+    """
+    to_address: str
+    token_name: str
+    token_id: int = -1
+    error: str | None = None
+
+class MintStatus(BaseModel):
+    """
+    MintStatus class to represent the status of a reward queued in the outbox.
+    The status is one of queued, sent, confirmed and failed.
+    """
+    tracking_id: str
+    to_address: str
+    token_name: str
+    status: Literal["queued", "sent", "confirmed", "failed"]
+    attempts: int = 0
+    tx_hash: str | None = None
+    token_id: int = -1
+    error: str | None = None
+
 class AgentConfig(BaseModel):
     """
     Configuration for the agent.
+    The token list in the prompt is capped to token_budget tokens counted with the tokenizer of tokenizer_model,
+    or not capped if token_budget is None.
+    The report is built from the state without the model if reporting_mode is direct,
+    and only its reason is written by the model if generate_reason is True.
+    If reporting_mode is llm, the model calls the reporting tool.
+    The responses of the model with tools are cached in llm_cache_path up to llm_cache_size responses,
+    and the cache is bypassed if llm_cache is False.
     """
     tools: List
     name: str
     roll: str
+    token_budget: int | None = 2000
+    tokenizer_model: str = "gpt-4o"
+    reporting_mode: Literal["direct", "llm"] = "direct"
+    generate_reason: bool = False
+    llm_cache: bool = True
+    llm_cache_path: str = ".cache/llm_responses.sqlite3"
+    llm_cache_size: int = 1000
 
 class State(BaseModel):
     """
@@ -28,4 +73,6 @@ class State(BaseModel):
     tokens: List[Token] = []
     address: str = ""
     token_name: str = ""
+    token_id: int = -1
+    tracking_id: str = ""
     status: Literal["fetchTokens", "putToken", "reporting", "__end__"] = "fetchTokens"
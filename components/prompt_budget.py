@@ -0,0 +1,90 @@
+from functools import lru_cache
+from typing import Callable, List
+import tiktoken
+
+from components.model import Token
+
+DEFAULT_ENCODING = "o200k_base"
+
+@lru_cache(maxsize=None)
+def get_token_counter(model_name: str) -> Callable[[str], int]:
+    """
+    Get the function that counts the tokens of a text for the model, loaded once per model.
+    If the encoding of tiktoken cannot be loaded (e.g. it cannot be downloaded), the tokens are estimated from the UTF-8 bytes.
+    """
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            # The model is unknown to tiktoken, e.g. the name of an Azure deployment
+            encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        print(f"Error loading the tiktoken encoding, estimating the tokens instead: {e}")
+        return lambda text: len(text.encode("utf-8")) // 3 + 1
+    return lambda text: len(encoding.encode(text))
+
+def format_token(token: Token) -> str:
+    return f"- トークンID: {token.token_id}, トークン名: {token.token_name}, 転送元アドレス: {token.from_address}, 転送先アドレス: {token.to_address}"
+
+def rank_tokens(tokens: List[Token], address: str) -> List[int]:
+    """
+    Rank the tokens by relevance and return their positions in the list, the most relevant first.
+    1. The latest token of each recipient that involves my address
+    2. The latest token of each other recipient
+    3. The other tokens
+    The tokens are in the order of the chain, so the later ones are the more recent in each group.
+    """
+    address = address.lower()
+    seen_recipients = set()
+    groups = ([], [], [])
+    for position in reversed(range(len(tokens))):
+        token = tokens[position]
+        recipient = token.to_address.lower()
+        if recipient in seen_recipients:
+            groups[2].append(position)
+            continue
+        seen_recipients.add(recipient)
+        if address in (token.from_address.lower(), recipient):
+            groups[0].append(position)
+        else:
+            groups[1].append(position)
+    return groups[0] + groups[1] + groups[2]
+
+def format_token_list(tokens: List[Token], address: str, budget: int | None, model_name: str) -> str:
+    """
+    Format the tokens for the prompt within the budget of LLM tokens.
+    The most relevant tokens are kept in the order of the chain, and the others are collapsed into a summary line.
+    If the budget is None, all the tokens are listed.
+    """
+    if len(tokens) == 0:
+        return "発行されたトークンはありません。"
+    if budget is None:
+        return "\n".join(format_token(token) for token in tokens)
+
+    count_tokens = get_token_counter(model_name)
+    # Keep room for the summary line of the omitted tokens
+    summary_size = count_tokens(summarize_tokens(tokens))
+    selected = []
+    used = 0
+    for position in rank_tokens(tokens, address):
+        size = count_tokens(format_token(tokens[position])) + 1
+        omitted = len(tokens) - len(selected) - 1
+        if used + size + (summary_size if omitted > 0 else 0) > budget:
+            break
+        selected.append(position)
+        used += size
+
+    selected.sort()
+    lines = [format_token(tokens[position]) for position in selected]
+    if len(selected) < len(tokens):
+        kept = set(selected)
+        lines.append(summarize_tokens([token for position, token in enumerate(tokens) if position not in kept]))
+    return "\n".join(lines)
+
+def summarize_tokens(tokens: List[Token]) -> str:
+    """
+    Summarize the omitted tokens in one line.
+    """
+    token_ids = [token.token_id for token in tokens]
+    recipients = {token.to_address.lower() for token in tokens}
+    return f"- 他{len(tokens)}件のトークン (トークンID: {min(token_ids)}〜{max(token_ids)}, 転送先アドレス: {len(recipients)}件) は省略しました。"
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langfuse.callback import CallbackHandler
 
@@ -18,9 +19,11 @@ def build_agent_graph(contract_agent: ContractAgent):
     graph_builder = StateGraph(State)
 
     # Add the ContractAgent to the graph
-    graph_builder.add_node("fetchTokens", contract_agent.get_agent)
-    graph_builder.add_node("putToken", contract_agent.get_agent)
-    graph_builder.add_node("reporting", contract_agent.get_agent)
+    # stream and invoke run get_agent, astream and ainvoke run aget_agent on the event loop
+    agent = RunnableLambda(contract_agent.get_agent, afunc=contract_agent.aget_agent)
+    graph_builder.add_node("fetchTokens", agent)
+    graph_builder.add_node("putToken", agent)
+    graph_builder.add_node("reporting", agent)
 
     # Add the thinking node to the graph
     graph_builder.add_edge(START, "fetchTokens")
@@ -0,0 +1,124 @@
+import time
+from collections import Counter
+from typing import Callable, Dict, List
+import pytest
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+class FakeChain:
+    """
+    Stub of w3.eth that counts the requests by method.
+    The blocks hold transaction hashes, and the sent raw transactions are recorded without being mined.
+    """
+    def __init__(self):
+        self.requests = Counter()
+        self.blocks: List[List[HexBytes]] = [[]]
+        self.receipts: Dict[HexBytes, Dict] = {}
+        self.sent: List[HexBytes] = []
+        # The transaction counts of the account by block identifier
+        self.transaction_count = {"latest": 0, "pending": 0}
+        self.base_fee = 100
+        self.rewards = []
+
+    @property
+    def block_number(self) -> int:
+        self.requests["block_number"] += 1
+        return len(self.blocks) - 1
+
+    @property
+    def chain_id(self) -> int:
+        self.requests["chain_id"] += 1
+        return 31337
+
+    def mine(self, tx_hashes) -> None:
+        """
+        Add a block with the transactions and their successful receipts.
+        """
+        block = [HexBytes(tx_hash) for tx_hash in tx_hashes]
+        self.blocks.append(block)
+        for tx_hash in block:
+            self.receipts.setdefault(tx_hash, {"transactionHash": tx_hash, "blockNumber": len(self.blocks) - 1, "status": 1})
+
+    def get_block(self, block_number: int) -> Dict:
+        self.requests["get_block"] += 1
+        return {"number": block_number, "transactions": self.blocks[block_number]}
+
+    def get_transaction_receipt(self, tx_hash) -> Dict:
+        self.requests["get_transaction_receipt"] += 1
+        if HexBytes(tx_hash) not in self.receipts:
+            raise TransactionNotFound(f"Transaction {HexBytes(tx_hash).to_0x_hex()} not found")
+        return self.receipts[HexBytes(tx_hash)]
+
+    def send_raw_transaction(self, raw_transaction) -> HexBytes:
+        self.requests["send_raw_transaction"] += 1
+        self.sent.append(HexBytes(raw_transaction))
+        return Web3.keccak(raw_transaction)
+
+    def get_transaction_count(self, address: str, block_identifier: str) -> int:
+        self.requests["get_transaction_count"] += 1
+        return self.transaction_count[block_identifier]
+
+    def fee_history(self, block_count: int, newest_block, reward_percentiles) -> Dict:
+        self.requests["fee_history"] += 1
+        return {"baseFeePerGas": [self.base_fee] * (block_count + 1), "reward": self.rewards}
+
+class FakeBatch:
+    def __init__(self):
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def add(self, result):
+        self.results.append(result)
+
+    def execute(self):
+        return self.results
+
+class FakeProvider:
+    """
+    Stub of the provider that answers the raw batch requests of receipts from the fake chain.
+    """
+    def __init__(self, eth: FakeChain):
+        self.eth = eth
+        self.endpoint_uri = "http://fake-chain"
+
+    def make_batch_request(self, requests):
+        responses = []
+        for method, params in requests:
+            self.eth.requests[method] += 1
+            responses.append({"result": {} if HexBytes(params[0]) in self.eth.receipts else None})
+        return responses
+
+class FakeWeb3:
+    def __init__(self):
+        self.eth = FakeChain()
+        self.provider = FakeProvider(self.eth)
+
+    def batch_requests(self):
+        return FakeBatch()
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5.0, interval: float = 0.01) -> None:
+    """
+    Poll the condition until it is true, instead of sleeping for a fixed time.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError(f"Condition not met after {timeout} seconds")
+        time.sleep(interval)
+
+@pytest.fixture
+def w3() -> FakeWeb3:
+    """
+    Fake Web3 instance on a fresh fake chain.
+    """
+    return FakeWeb3()
+
+@pytest.fixture(name="wait_until")
+def wait_until_fixture() -> Callable:
+    return wait_until
@@ -0,0 +1,47 @@
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.events import get_event_data
+from tools.abi_artifacts import TransferEvent, decode_transfer_log, get_event_topics, get_function_selectors
+from tools.ssdlab_token_abi import abi
+
+CONTRACT_ADDRESS = "0x5fbDB2315678aFEcb367F032D93F2642Aa0Afa3c"
+FROM_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+TO_ADDRESS = "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC"
+
+def transfer_log(token_id: int, address: str = CONTRACT_ADDRESS):
+    return {
+        "address": address,
+        "topics": [
+            get_event_topics()["Transfer"],
+            HexBytes(bytes(12) + bytes(HexBytes(FROM_ADDRESS))),
+            HexBytes(bytes(12) + bytes(HexBytes(TO_ADDRESS))),
+            HexBytes(token_id.to_bytes(32, "big")),
+        ],
+        "data": HexBytes(b""),
+        "logIndex": 1,
+        "transactionIndex": 0,
+        "transactionHash": HexBytes(b"\x01" * 32),
+        "blockHash": HexBytes(b"\x02" * 32),
+        "blockNumber": 3,
+    }
+
+def test_decode_transfer_log_matches_web3():
+    w3 = Web3()
+    contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=abi)
+    log = transfer_log(2**200 + 5)
+    expected = get_event_data(w3.codec, contract.events.Transfer().abi, log)
+    assert decode_transfer_log(log) == expected
+
+def test_selectors_and_topics():
+    contract = Web3().eth.contract(address=CONTRACT_ADDRESS, abi=abi)
+    for name in ("safeMint", "setTokenName", "ownerOf"):
+        signature = contract.get_function_by_name(name).signature
+        assert get_function_selectors()[signature] == Web3.keccak(text=signature)[:4]
+    assert get_event_topics()["Transfer"] == Web3.keccak(text="Transfer(address,address,uint256)")
+
+def test_process_receipt_skips_other_logs():
+    event = TransferEvent(Web3(), CONTRACT_ADDRESS)
+    other_contract = transfer_log(1, address=TO_ADDRESS)
+    other_event = {**transfer_log(2), "topics": [get_event_topics()["Approval"]] + transfer_log(2)["topics"][1:]}
+    logs = event.process_receipt({"logs": [other_contract, transfer_log(3), other_event]})
+    assert [log["args"]["tokenId"] for log in logs] == [3]
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from tools.contract import get_contract, reset_contracts
+
+CONTRACT_ADDRESS = "0x5fbDB2315678aFEcb367F032D93F2642Aa0Afa3c"
+PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+OTHER_PRIVATE_KEY = "0x59c6995e998f97a5a0044966f0945389dc9e86dae88c7a8412f4603b6b78690d"
+# Nothing listens on this port, so any RPC call fails
+RPC_URL = "http://127.0.0.1:9"
+
+@pytest.fixture(autouse=True)
+def contracts():
+    # Each test creates its own shared clients
+    reset_contracts()
+    yield
+    reset_contracts()
+
+def test_get_contract_is_shared(tmp_path):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        contracts = list(executor.map(
+            lambda _: get_contract(RPC_URL, CONTRACT_ADDRESS, PRIVATE_KEY, cache_dir=str(tmp_path)),
+            range(8),
+        ))
+    assert all(contract is contracts[0] for contract in contracts)
+    assert get_contract(RPC_URL, CONTRACT_ADDRESS.lower(), PRIVATE_KEY) is contracts[0]
+    assert get_contract(RPC_URL, CONTRACT_ADDRESS, OTHER_PRIVATE_KEY, cache_dir=str(tmp_path)) is not contracts[0]
+
+def test_get_contract_with_other_options(tmp_path):
+    contract = get_contract(RPC_URL, CONTRACT_ADDRESS, PRIVATE_KEY, cache_dir=str(tmp_path))
+    assert get_contract(RPC_URL, CONTRACT_ADDRESS, PRIVATE_KEY, cache_dir=str(tmp_path), confirmations=12) is contract
+    with pytest.raises(Exception, match="cache_dir, confirmations"):
+        get_contract(RPC_URL, CONTRACT_ADDRESS, PRIVATE_KEY, cache_dir=str(tmp_path / "other"), confirmations=1)
+
+def test_connect_lazily(tmp_path):
+    # The client is created without a connection and fails on its first use
+    contract = get_contract(RPC_URL, CONTRACT_ADDRESS, PRIVATE_KEY, cache_dir=str(tmp_path))
+    assert contract.get_address() == "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+    with pytest.raises(Exception, match="Failed to connect"):
+        contract.sync_index()
@@ -0,0 +1,127 @@
+import asyncio
+from langchain_core.messages import AIMessage
+from components.contract_agent import ContractAgent
+from components.model import AgentConfig, State, Token
+
+MY_ADDRESS = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+TO_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+
+class ToolStub:
+    """
+    Stub of a tool that records its calls.
+    """
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.calls = []
+
+    def invoke(self, args):
+        self.calls.append(args)
+        return self.func(**args)
+
+    async def ainvoke(self, args):
+        return self.invoke(args)
+
+class ModelStub:
+    """
+    Stub of the chat model that answers with a reporting tool call or a text and counts its calls.
+    """
+    def __init__(self):
+        self.calls = {"tools": 0, "text": 0}
+        self.bound = []
+        self.prompts = []
+
+    def bind_tools(self, tools, **kwargs):
+        self.bound.append(([tool.name for tool in tools], kwargs))
+        return ModelWithToolsStub(self)
+
+    def invoke(self, prompt, config=None):
+        self.calls["text"] += 1
+        return AIMessage(content="貢献に感謝して発行しました。")
+
+    async def ainvoke(self, prompt, config=None):
+        return self.invoke(prompt, config)
+
+class ModelWithToolsStub:
+    def __init__(self, model: ModelStub):
+        self.model = model
+
+    def invoke(self, prompt, config=None):
+        self.model.calls["tools"] += 1
+        self.model.prompts.append(prompt)
+        args = {"token_list": "LLM", "token": "LLM", "reason": "LLM", "owner": "LLM"}
+        return AIMessage(content="", tool_calls=[{"name": "reporting", "args": args, "id": "1"}])
+
+def reporting(token_list, token, reason, owner):
+    return f"トークン一覧:\n {token_list}\n発行するトークン:\n {token}\nトークンを発行する理由:\n {reason}\n送信先アドレス:\n {owner}\n"
+
+def make_agent(**config):
+    tools = [
+        ToolStub("put_token", lambda to_address, token_name: 1),
+        ToolStub("fetch_tokens", lambda address: []),
+        ToolStub("reporting", reporting),
+        ToolStub("get_address", lambda **args: MY_ADDRESS),
+        ToolStub("put_tokens", lambda rewards: []),
+        ToolStub("get_mint_status", lambda tracking_id: None),
+    ]
+    model = ModelStub()
+    config = {"llm_cache": False, **config}
+    agent = ContractAgent(model=model, config=AgentConfig(tools=tools, name="田中", roll="エンジニア", **config))
+    return agent, model, tools
+
+def make_state():
+    return State(
+        tokens=[Token(from_address=MY_ADDRESS, to_address=TO_ADDRESS, token_id=3, token_name="Old Token")],
+        address=TO_ADDRESS,
+        token_name="New Token",
+        token_id=4,
+        status="reporting",
+    )
+
+def test_direct_reporting():
+    agent, model, tools = make_agent()
+    response = agent.get_agent(make_state())
+    assert model.calls == {"tools": 0, "text": 0}
+    assert response.status == "__end__"
+    report = response.messages[0].content
+    assert "トークンID: 3, トークン名: Old Token" in report
+    assert "トークン名: New Token, トークンID: 4" in report
+    assert f"送信先アドレス:\n {TO_ADDRESS}" in report
+    assert len(tools[2].calls) == 1
+
+def test_direct_reporting_with_reason():
+    agent, model, _ = make_agent(generate_reason=True)
+    response = asyncio.run(agent.aget_agent(make_state()))
+    assert model.calls == {"tools": 0, "text": 1}
+    assert "トークンを発行する理由:\n 貢献に感謝して発行しました。" in response.messages[0].content
+
+def test_llm_reporting():
+    agent, model, _ = make_agent(reporting_mode="llm")
+    response = agent.get_agent(make_state())
+    assert model.calls == {"tools": 1, "text": 0}
+    assert "発行するトークン:\n LLM" in response.messages[0].content
+
+def test_bound_model_per_status():
+    agent, model, _ = make_agent(reporting_mode="llm")
+    for _ in range(2):
+        agent.get_agent(make_state())
+    # Only the reporting tool is bound, once, and the model is forced to call it
+    assert model.bound == [(["reporting"], {"tool_choice": "reporting"})]
+    prompt = model.prompts[0]
+    assert "must call the reporting function" in prompt[0].content
+    assert "トークンID: 3, トークン名: Old Token" in prompt[1].content
+    assert f"Wallet address: {MY_ADDRESS}" in prompt[2].content
+
+def test_llm_response_cache(tmp_path):
+    path = str(tmp_path / "llm_responses.sqlite3")
+    agent, model, _ = make_agent(reporting_mode="llm", llm_cache=True, llm_cache_path=path)
+    first = agent.get_agent(make_state())
+    second = agent.get_agent(make_state())
+    assert model.calls["tools"] == 1
+    assert second.messages[0].content == first.messages[0].content
+
+    # The cache persists across agents and a different prompt is a miss
+    agent, model, _ = make_agent(reporting_mode="llm", llm_cache=True, llm_cache_path=path)
+    agent.get_agent(make_state())
+    agent.get_agent(make_state().model_copy(update={"tokens": []}))
+    assert model.calls["tools"] == 1
@@ -0,0 +1,43 @@
+from tools.fee_oracle import FeeOracle
+
+class FunctionStub:
+    """
+    Stub of a contract function whose gas grows with the length of its calldata.
+    """
+    def __init__(self, fn_name: str, data: bytes):
+        self.fn_name = fn_name
+        self.data = data
+        self.estimates = 0
+
+    def _encode_transaction_data(self):
+        return "0x" + self.data.hex()
+
+    def estimate_gas(self, transaction):
+        self.estimates += 1
+        return 100000 + len(self.data) * 100
+
+def test_transaction_params_are_cached(w3):
+    w3.eth.rewards = [[3], [1], [2]]
+    oracle = FeeOracle(w3, ttl=60)
+    function = FunctionStub("safeMint", b"\x00" * 100)
+    params = [oracle.get_transaction_params(function, "0x70997970C51812dc3A010C7d01b50e0d17dc79C8") for _ in range(10)]
+    assert params[0] == {"chainId": 31337, "gas": 132000, "maxFeePerGas": 202, "maxPriorityFeePerGas": 2}
+    assert all(param == params[0] for param in params)
+    assert w3.eth.requests == {"chain_id": 1, "fee_history": 1}
+    assert function.estimates == 1
+
+def test_gas_is_estimated_per_calldata_size(w3):
+    oracle = FeeOracle(w3)
+    short_function = FunctionStub("safeMint", b"\x00" * 100)
+    long_function = FunctionStub("safeMint", b"\x00" * 1000)
+    assert oracle.get_gas(short_function, "0x00") < oracle.get_gas(long_function, "0x00")
+    assert oracle.get_gas(FunctionStub("safeMint", b"\x01" * 100), "0x00") == oracle.get_gas(short_function, "0x00")
+    assert short_function.estimates == 1
+    assert long_function.estimates == 1
+
+def test_fees_expire(w3):
+    oracle = FeeOracle(w3, ttl=0, default_priority_fee=5)
+    assert oracle.get_fees() == (205, 5)
+    w3.eth.base_fee = 1000
+    assert oracle.get_fees() == (2005, 5)
+    assert w3.eth.requests["fee_history"] == 2
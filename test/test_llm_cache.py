@@ -0,0 +1,37 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from components.llm_cache import LLMResponseCache
+
+def response(i: int) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": "put_token", "args": {"token_name": f"Token {i}"}, "id": str(i)}])
+
+def test_get_and_put(tmp_path):
+    path = str(tmp_path / "llm_responses.sqlite3")
+    cache = LLMResponseCache(path)
+    key = cache.make_key("model", {"tool_choice": "put_token"}, [HumanMessage(content="mint")])
+    assert cache.get(key) is None
+    cache.put(key, response(1))
+    assert cache.get(key).tool_calls[0]["args"] == {"token_name": "Token 1"}
+
+    # The responses are loaded from the file by the next run
+    cache = LLMResponseCache(path)
+    assert len(cache) == 1
+    assert cache.get(key).tool_calls[0]["id"] == "1"
+
+def test_key():
+    messages = [HumanMessage(content="mint")]
+    key = LLMResponseCache.make_key("model", {"tool_choice": "put_token"}, messages)
+    assert key == LLMResponseCache.make_key("model", {"tool_choice": "put_token"}, [HumanMessage(content="mint")])
+    assert key != LLMResponseCache.make_key("model", {"tool_choice": "reporting"}, messages)
+    assert key != LLMResponseCache.make_key("model", {"tool_choice": "put_token"}, [HumanMessage(content="report")])
+    assert key != LLMResponseCache.make_key(1, {"tool_choice": "put_token"}, messages)
+
+def test_evict_least_recently_used():
+    cache = LLMResponseCache(":memory:", max_size=2)
+    for i in range(2):
+        cache.put(str(i), response(i))
+    cache.get("0")
+    cache.put("2", response(2))
+    assert len(cache) == 2
+    assert cache.get("1") is None
+    assert cache.get("0") is not None
+    assert cache.get("2") is not None
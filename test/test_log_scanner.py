@@ -0,0 +1,30 @@
+from tools.log_scanner import LogScanner
+import pytest
+
+class BlockEvent:
+    """
+    Event stub that emits one log per block and rejects ranges larger than max_range.
+    """
+    def __init__(self, max_range: int):
+        self.max_range = max_range
+
+    def get_logs(self, from_block: int, to_block: int):
+        if to_block - from_block + 1 > self.max_range:
+            raise Exception("query returned more than the limit")
+        return list(range(from_block, to_block + 1))
+
+@pytest.mark.parametrize("initial_window,max_range,max_workers", [
+    (1, 1000, 1),
+    (64, 16, 3),
+    (2000, 1, 4),
+])
+def test_scan_covers_range_in_order(initial_window, max_range, max_workers):
+    scanner = LogScanner(BlockEvent(max_range), initial_window=initial_window, target_logs=10, max_workers=max_workers)
+    pages = list(scanner.scan(0, 99))
+    assert [log for _, page in pages for log in page] == list(range(100))
+    assert pages[-1][0] == 99
+
+def test_scan_raises_at_min_window():
+    scanner = LogScanner(BlockEvent(0), initial_window=4)
+    with pytest.raises(Exception):
+        list(scanner.scan(0, 10))
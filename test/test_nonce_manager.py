@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+from tools.nonce_manager import NonceManager
+
+def test_allocate_concurrently(w3):
+    w3.eth.transaction_count["pending"] = 5
+    nonce_manager = NonceManager(w3, "0x70997970C51812dc3A010C7d01b50e0d17dc79C8")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        nonces = list(executor.map(lambda _: nonce_manager.allocate(), range(100)))
+    assert sorted(nonces) == list(range(5, 105))
+    assert w3.eth.requests["get_transaction_count"] == 1
+
+def test_resync(w3):
+    nonce_manager = NonceManager(w3, "0x70997970C51812dc3A010C7d01b50e0d17dc79C8")
+    assert [nonce_manager.allocate() for _ in range(3)] == [0, 1, 2]
+    for nonce in range(3):
+        nonce_manager.release(nonce)
+
+    # The transaction with nonce 1 was dropped after it was broadcast
+    w3.eth.transaction_count["pending"] = 1
+    nonce_manager.resync()
+    assert nonce_manager.allocate() == 1
+
+def test_resync_keeps_in_flight_nonces(w3):
+    nonce_manager = NonceManager(w3, "0x70997970C51812dc3A010C7d01b50e0d17dc79C8")
+    assert [nonce_manager.allocate() for _ in range(3)] == [0, 1, 2]
+    nonce_manager.release(0)
+    w3.eth.transaction_count["pending"] = 1
+
+    # The send of nonce 1 fails while nonce 2 is signed but not broadcast yet, so nonce 2 is not handed out again
+    nonce_manager.resync(1)
+    assert nonce_manager.allocate() == 3
+
+    # Nothing is in flight anymore, so the chain decides
+    nonce_manager.resync(2)
+    nonce_manager.resync(3)
+    assert nonce_manager.allocate() == 1
@@ -0,0 +1,44 @@
+from components.model import Token
+from components.prompt_budget import format_token, format_token_list, get_token_counter, rank_tokens
+
+MY_ADDRESS = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+OTHER_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+MODEL = "gpt-4o"
+
+def make_tokens():
+    # Many tokens between other addresses, then one token to each of two recipients
+    tokens = [
+        Token(from_address=ZERO_ADDRESS, to_address=OTHER_ADDRESS, token_id=i, token_name=f"Token {i}")
+        for i in range(100)
+    ]
+    tokens.append(Token(from_address=MY_ADDRESS, to_address="0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC", token_id=100, token_name="Mine"))
+    tokens.append(Token(from_address=ZERO_ADDRESS, to_address="0x90F79bf6EB2c4f870365E785982E1f101E93b906", token_id=101, token_name="Other"))
+    return tokens
+
+def test_rank_tokens():
+    tokens = make_tokens()
+    # My token, then the latest token of each other recipient, then the rest from the most recent
+    assert rank_tokens(tokens, MY_ADDRESS)[:5] == [100, 101, 99, 98, 97]
+
+def test_format_within_budget():
+    tokens = make_tokens()
+    count_tokens = get_token_counter(MODEL)
+    budget = count_tokens(format_token(tokens[0])) * 6
+    token_list = format_token_list(tokens, MY_ADDRESS, budget, MODEL)
+    assert count_tokens(token_list) <= budget
+
+    lines = token_list.split("\n")
+    # The two latest tokens are kept before the summary line
+    assert "トークン名: Mine" in lines[-3]
+    assert "トークン名: Other" in lines[-2]
+    # The kept tokens are in the order of the chain and the others are summarized
+    token_ids = [int(line.split(",")[0].split(": ")[1]) for line in lines[:-1]]
+    assert token_ids == sorted(token_ids)
+    assert lines[-1].startswith(f"- 他{len(tokens) - len(token_ids)}件のトークン")
+
+def test_format_all_tokens():
+    tokens = make_tokens()
+    assert format_token_list(tokens, MY_ADDRESS, None, MODEL) == "\n".join(format_token(token) for token in tokens)
+    assert format_token_list(tokens, MY_ADDRESS, 100000, MODEL) == "\n".join(format_token(token) for token in tokens)
+    assert format_token_list([], MY_ADDRESS, 100, MODEL) == "発行されたトークンはありません。"
@@ -0,0 +1,47 @@
+import pytest
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+from tools.receipt_tracker import ReceiptTracker
+
+def tx_hash(i: int) -> HexBytes:
+    return HexBytes(i.to_bytes(32, "big"))
+
+def test_resolve_from_new_blocks(w3, wait_until):
+    tracker = ReceiptTracker(w3, poll_interval=0.01)
+    # One transaction is already mined when it is tracked
+    w3.eth.mine([tx_hash(0)])
+    futures = [tracker.track(tx_hash(i)) for i in range(100)]
+    # The others are found in the new blocks after the tracker read the latest block
+    wait_until(lambda: tracker.last_block is not None)
+    w3.eth.mine([tx_hash(i) for i in range(1, 50)])
+    w3.eth.mine([tx_hash(i) for i in range(50, 100)])
+
+    receipts = [future.result(timeout=5) for future in futures]
+    assert [receipt["transactionHash"] for receipt in receipts] == [tx_hash(i) for i in range(100)]
+    # Each new block is fetched once and only the mined transactions are requested
+    assert w3.eth.requests["get_block"] <= 2
+    assert w3.eth.requests["get_transaction_receipt"] == 100
+    assert w3.eth.requests["eth_getTransactionReceipt"] == 100
+    wait_until(lambda: tracker.thread is None)
+
+def test_track_same_transaction(w3):
+    tracker = ReceiptTracker(w3, poll_interval=0.01)
+    assert tracker.track(tx_hash(1)) is tracker.track(tx_hash(1).to_0x_hex())
+    w3.eth.mine([tx_hash(1)])
+    assert tracker.track(tx_hash(1)).result(timeout=5)["blockNumber"] == 1
+
+def test_timeout(w3):
+    tracker = ReceiptTracker(w3, poll_interval=0.01, timeout=0.05)
+    future = tracker.track(tx_hash(1))
+    with pytest.raises(TimeExhausted):
+        future.result(timeout=5)
+    assert tracker.pending_count() == 0
+
+def test_resolve_replacement(w3):
+    tracker = ReceiptTracker(w3, poll_interval=0.01)
+    future = tracker.track(tx_hash(1))
+    tracker.replace(tx_hash(1), tx_hash(2))
+    assert tracker.pending_count() == 1
+    w3.eth.mine([tx_hash(2)])
+    assert future.result(timeout=5)["transactionHash"] == tx_hash(2)
+    assert tracker.pending_count() == 0
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import pytest
+from tools.rpc_transport import PooledHTTPProvider, TransportConfig, get_async_web3, get_session
+
+RPC_URL = "http://127.0.0.1:8545"
+
+def test_session_is_shared_across_threads():
+    provider = PooledHTTPProvider(RPC_URL)
+    other_provider = PooledHTTPProvider(RPC_URL)
+    sessions = []
+    threads = [
+        threading.Thread(target=lambda: sessions.append(provider._request_session_manager.cache_and_return_session(RPC_URL)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sessions.append(other_provider._request_session_manager.cache_and_return_session(RPC_URL))
+    assert all(session is get_session(RPC_URL) for session in sessions)
+
+def test_pool_and_timeouts():
+    config = TransportConfig(connect_timeout=1.0, read_timeout=5.0, pool_size=8)
+    provider = PooledHTTPProvider(RPC_URL, config)
+    assert dict(provider.get_request_kwargs())["timeout"] == (1.0, 5.0)
+    adapter = get_session(RPC_URL, config).get_adapter(RPC_URL)
+    assert adapter._pool_maxsize == 8
+
+def test_async_pool_and_timeouts():
+    config = TransportConfig(connect_timeout=1.0, read_timeout=5.0, pool_size=8)
+
+    async def request():
+        w3 = await get_async_web3(RPC_URL, config)
+        session = await w3.provider.cache_async_session(None)
+        requests = []
+
+        async def spy(method, url, **kwargs):
+            requests.append(kwargs)
+            raise ConnectionError("spy")
+
+        session._request = spy
+        assert session.connector.limit == 8
+        try:
+            with pytest.raises(ConnectionError):
+                await w3.provider.make_request("eth_chainId", [])
+        finally:
+            await w3.provider.disconnect()
+        return requests
+
+    requests = asyncio.run(request())
+    # The timeouts of the config are sent with each request instead of the default of web3
+    timeout = requests[0]["timeout"]
+    assert (timeout.sock_connect, timeout.sock_read, timeout.total) == (1.0, 5.0, None)
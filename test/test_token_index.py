@@ -0,0 +1,103 @@
+from hexbytes import HexBytes
+from tools.token_index import TokenIndex
+import pytest
+
+CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+def make_log(block_number, log_index, from_address, to_address, token_id):
+    return {
+        "blockNumber": block_number,
+        "logIndex": log_index,
+        "transactionHash": HexBytes(block_number.to_bytes(32, "big")),
+        "args": {"from": from_address, "to": to_address, "tokenId": token_id},
+    }
+
+def test_checkpoint_and_merge():
+    index = TokenIndex(":memory:", CONTRACT_ADDRESS)
+    assert index.get_last_block() == -1
+
+    index.add_transfers([
+        make_log(1, 0, "0x0000000000000000000000000000000000000000", "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", 1),
+    ], 5)
+    assert index.get_last_block() == 5
+
+    # Duplicate logs are ignored and new logs are merged in chain order
+    index.add_transfers([
+        make_log(1, 0, "0x0000000000000000000000000000000000000000", "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", 1),
+        make_log(7, 0, "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC", 1),
+    ], 9)
+    transfers = index.get_transfers()
+    assert index.get_last_block() == 9
+    assert [transfer["block_number"] for transfer in transfers] == [1, 7]
+    assert transfers[1]["token_id"] == 1
+
+@pytest.mark.parametrize("other_address,expected_count", [
+    (CONTRACT_ADDRESS, 1),
+    ("0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512", 0),
+])
+def test_index_is_bound_to_contract(tmp_path, other_address, expected_count):
+    path = str(tmp_path / "index.sqlite3")
+    index = TokenIndex(path, CONTRACT_ADDRESS)
+    index.add_transfers([
+        make_log(1, 0, "0x0000000000000000000000000000000000000000", "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", 1),
+    ], 1)
+
+    reopened = TokenIndex(path, other_address)
+    assert len(reopened.get_transfers()) == expected_count
+
+@pytest.mark.parametrize("address,expected_blocks", [
+    (None, [1, 7]),
+    ("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", [1, 7]),
+    ("0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC", [7]),
+    ("0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266", []),
+])
+def test_filter_by_address(address, expected_blocks):
+    index = TokenIndex(":memory:", CONTRACT_ADDRESS)
+    index.add_transfers([
+        make_log(1, 0, "0x0000000000000000000000000000000000000000", "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", 1),
+        make_log(7, 0, "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC", 1),
+    ], 9)
+    assert [transfer["block_number"] for transfer in index.get_transfers(address)] == expected_blocks
+
+def test_iter_transfers_in_pages():
+    index = TokenIndex(":memory:", CONTRACT_ADDRESS)
+    index.add_transfers([
+        make_log(block_number, 0, "0x0000000000000000000000000000000000000000", "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", block_number)
+        for block_number in range(1, 6)
+    ], 5)
+    pages = list(index.iter_transfers(page_size=2))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [transfer["token_id"] for page in pages for transfer in page] == [1, 2, 3, 4, 5]
+
+def test_block_hashes_and_rollback():
+    index = TokenIndex(":memory:", CONTRACT_ADDRESS)
+    index.add_transfers([
+        make_log(2, 0, "0x0000000000000000000000000000000000000000", "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", 1),
+        make_log(4, 0, "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC", 1),
+    ], 5, {3: "0x03", 4: "0x04", 5: "0x05"}, final_block=3)
+
+    # The hashes of the final blocks are dropped
+    assert index.get_block_hashes() == {4: "0x04", 5: "0x05"}
+
+    index.rollback(4)
+    assert index.get_last_block() == 3
+    assert index.get_block_hashes() == {}
+    assert [transfer["block_number"] for transfer in index.get_transfers()] == [2]
+
+def test_owners_and_balances():
+    index = TokenIndex(":memory:", CONTRACT_ADDRESS)
+    index.add_transfers([
+        make_log(1, 0, "0x0000000000000000000000000000000000000000", "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", 1),
+        make_log(2, 0, "0x0000000000000000000000000000000000000000", "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", 2),
+        make_log(3, 0, "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC", 1),
+    ], 3)
+    assert index.get_owner(1) == "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC"
+    assert index.get_owner(3) is None
+    assert index.get_balance("0x70997970C51812dc3A010C7d01b50e0d17dc79C8") == 1
+    assert index.get_balance("0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC") == 1
+
+    # Rolling back the transfer returns the token to the previous owner
+    index.rollback(3)
+    assert index.get_owner(1) == "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+    assert index.get_balance("0x70997970C51812dc3A010C7d01b50e0d17dc79C8") == 2
+    assert index.get_balance("0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC") == 0
@@ -0,0 +1,34 @@
+from tools.token_name_cache import TokenNameCache
+
+def test_lru_eviction():
+    cache = TokenNameCache(":memory:", max_size=2)
+    cache.put_many({1: "TEST TOKEN 1", 2: "TEST TOKEN 2"})
+    assert cache.get_many([1]) == {1: "TEST TOKEN 1"}
+
+    # Token 2 is the least recently used entry
+    cache.put_many({3: "TEST TOKEN 3"})
+    assert cache.get_many([1, 2, 3]) == {1: "TEST TOKEN 1", 3: "TEST TOKEN 3"}
+
+def test_persist_and_invalidate(tmp_path):
+    path = str(tmp_path / "names.sqlite3")
+    cache = TokenNameCache(path)
+    cache.put_many({1: "TEST TOKEN 1", 2: "TEST TOKEN 2"})
+    cache.invalidate([2])
+
+    reopened = TokenNameCache(path)
+    assert len(reopened) == 1
+    assert reopened.get_many([1, 2]) == {1: "TEST TOKEN 1"}
+
+def test_invalidate_shared_file(tmp_path):
+    # Two clients of the same contract share the file, and only one of them sees the rename
+    path = str(tmp_path / "names.sqlite3")
+    cache = TokenNameCache(path)
+    cache.put_many({1: "Old", 2: "TEST TOKEN 2"})
+    other = TokenNameCache(path)
+    assert other.get_many([1, 2]) == {1: "Old", 2: "TEST TOKEN 2"}
+
+    cache.invalidate([1])
+    assert other.get_many([1, 2]) == {2: "TEST TOKEN 2"}
+    assert other.get_all() == {2: "TEST TOKEN 2"}
+    other.invalidate([2])
+    assert cache.get_many([1, 2]) == {}
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from tools.tool_cache import ToolResultCache
+from tools.transfer_follower import TransferFollower
+
+def fetch_tokens(w3, address: str):
+    """
+    Stub of the tool that reads the chain and counts its calls.
+    """
+    w3.eth.requests["fetch_tokens"] += 1
+    return [f"{address}-{len(w3.eth.blocks) - 1}"]
+
+def block_number(w3):
+    return lambda: w3.eth.block_number
+
+def test_hit_within_ttl(w3):
+    cache = ToolResultCache(ttl=60)
+    for _ in range(3):
+        assert cache.get("fetch_tokens", {"address": "0x1"}, lambda: fetch_tokens(w3, "0x1"), block_number(w3)) == ["0x1-0"]
+    # The tool and the block number are read once, other arguments are cached separately
+    assert w3.eth.requests == {"block_number": 1, "fetch_tokens": 1}
+    cache.get("fetch_tokens", {"address": "0x2"}, lambda: fetch_tokens(w3, "0x2"), block_number(w3))
+    assert w3.eth.requests["fetch_tokens"] == 2
+
+def test_expired_entry_in_same_block(w3):
+    cache = ToolResultCache(ttl=0.01)
+    cache.get("fetch_tokens", {"address": "0x1"}, lambda: fetch_tokens(w3, "0x1"), block_number(w3))
+    time.sleep(0.02)
+    assert cache.get("fetch_tokens", {"address": "0x1"}, lambda: fetch_tokens(w3, "0x1"), block_number(w3)) == ["0x1-0"]
+    assert w3.eth.requests == {"block_number": 2, "fetch_tokens": 1}
+
+    # A new block makes the expired entry stale
+    w3.eth.mine([])
+    time.sleep(0.02)
+    assert cache.get("fetch_tokens", {"address": "0x1"}, lambda: fetch_tokens(w3, "0x1"), block_number(w3)) == ["0x1-1"]
+    assert w3.eth.requests == {"block_number": 3, "fetch_tokens": 2}
+
+def test_invalidate(w3):
+    cache = ToolResultCache(ttl=60)
+    cache.get("fetch_tokens", {"address": "0x1"}, lambda: fetch_tokens(w3, "0x1"), block_number(w3))
+    cache.invalidate()
+    assert len(cache) == 0
+    cache.get("fetch_tokens", {"address": "0x1"}, lambda: fetch_tokens(w3, "0x1"), block_number(w3))
+    assert w3.eth.requests["fetch_tokens"] == 2
+
+def test_invalidate_while_computing():
+    cache = ToolResultCache(ttl=60)
+
+    def compute():
+        # A transaction is sent while the tool reads the chain
+        cache.invalidate()
+        return "stale"
+
+    assert cache.get("fetch_tokens", {"address": None}, compute) == "stale"
+    assert len(cache) == 0
+
+def test_max_size():
+    cache = ToolResultCache(ttl=60, max_size=2)
+    for address in ["0x1", "0x2", "0x1", "0x3"]:
+        cache.get("fetch_tokens", {"address": address}, lambda: address)
+    assert [key[1] for key in cache.entries] == ['{"address": "0x1"}', '{"address": "0x3"}']
+
+def test_aget(w3):
+    cache = ToolResultCache(ttl=60)
+
+    async def afetch_tokens():
+        return fetch_tokens(w3, "0x1")
+
+    async def ablock_number():
+        return w3.eth.block_number
+
+    async def run():
+        return [await cache.aget("fetch_tokens", {"address": "0x1"}, afetch_tokens, ablock_number) for _ in range(3)]
+
+    assert asyncio.run(run()) == [["0x1-0"]] * 3
+    assert w3.eth.requests == {"block_number": 1, "fetch_tokens": 1}
+
+class IndexStub:
+    def get_last_block(self) -> int:
+        return 0
+
+class FollowedContractStub:
+    """
+    Stub of Contract whose sync_index calls a tool before the transfers of the new block are merged.
+    """
+    def __init__(self, w3):
+        self.w3 = w3
+        self.index = IndexStub()
+        self.tool_cache = ToolResultCache(ttl=60)
+
+    def fetch_tokens(self):
+        return self.tool_cache.get("fetch_tokens", {"address": "0x1"}, lambda: fetch_tokens(self.w3, "0x1"), block_number(self.w3))
+
+    def sync_index(self) -> int:
+        self.w3.eth.mine([])
+        # The index still has the transfers of block 0
+        self.stale = self.fetch_tokens()
+        return 0
+
+def test_invalidate_after_sync(w3):
+    contract = FollowedContractStub(w3)
+    TransferFollower(contract).on_new_block()
+    assert contract.stale == ["0x1-1"]
+    # The result computed during the sync is dropped, so the next call reads the merged index
+    assert len(contract.tool_cache) == 0
+    contract.fetch_tokens()
+    assert w3.eth.requests["fetch_tokens"] == 2
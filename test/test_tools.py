@@ -1,8 +1,12 @@
+import asyncio
 import os
+import threading
 from dotenv import load_dotenv
 from tools.tools import get_tools
-from tools.contract import Token
+from tools.contract import Contract, Token
+from tools.token_name_cache import TokenNameCache
 import pytest
+import time
 
 # Load environment variables, but don't fail if .env doesn't exist
 try:
@@ -15,24 +19,163 @@ RPC_URL = os.environ["RPC_URL"]
 CONTRACT_ADDRESS = os.environ["CONTRACT_ADDRESS"]
 PRIVATE_KEY = os.environ["PRIVATE_KEY"]
 
-def test_put_token():
-    tools = get_tools(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+@pytest.mark.parametrize("direct_mint", [True, False])
+def test_put_token(direct_mint):
+    tools = get_tools(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY, direct_mint=direct_mint)
     put_token_tool = tools[0]
     to_address = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
     token_name = "Test Token"
     token_id = put_token_tool.invoke({"to_address": to_address, "token_name": token_name})
     assert token_id is not None
     assert token_id != -1
+    contract = Contract(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+    assert contract.owner_of(token_id, verify=True) == to_address
+
+def test_put_token_async():
+    # Two tool sets share the client and send through its lock
+    tool_sets = [get_tools(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY) for _ in range(2)]
+    fetch_token_tool = tool_sets[0][1]
+    to_address = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+
+    async def run():
+        # The tool calls overlap their receipt waits on one event loop
+        token_ids = await asyncio.gather(*(
+            tool_sets[i % 2][0].ainvoke({"to_address": to_address, "token_name": f"Async Token {i}"})
+            for i in range(4)
+        ))
+        tokens = await fetch_token_tool.ainvoke({"address": to_address})
+        return token_ids, tokens
+
+    token_ids, tokens = asyncio.run(run())
+    assert -1 not in token_ids
+    assert len(set(token_ids)) == 4
+    names = {token.token_id: token.token_name for token in tokens}
+    for i, token_id in enumerate(token_ids):
+        assert names[token_id] == f"Async Token {i}"
+
+def test_async_web3_per_loop():
+    contract = Contract(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+    disconnected = []
+
+    async def run():
+        w3 = await contract.get_async_web3()
+        assert await contract.get_async_web3() is w3
+        disconnect = w3.provider.disconnect
+
+        async def record_disconnect():
+            disconnected.append(w3)
+            await disconnect()
+
+        w3.provider.disconnect = record_disconnect
+        await w3.eth.block_number
+        return w3
+
+    # Each event loop gets its own instance, and its session is closed when the loop shuts down
+    first = asyncio.run(run())
+    assert disconnected == [first]
+    second = asyncio.run(run())
+    assert second is not first
+    assert disconnected == [first, second]
+
+def test_put_token_outbox():
+    tools = get_tools(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY, outbox=True)
+    put_token_tool = tools[0]
+    get_mint_status_tool = tools[5]
+    to_address = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+    tracking_id = put_token_tool.invoke({"to_address": to_address, "token_name": "Outbox Token"})
+    assert type(tracking_id) == str
+    for _ in range(60):
+        mint_status = get_mint_status_tool.invoke({"tracking_id": tracking_id})
+        if mint_status.status in ("confirmed", "failed"):
+            break
+        time.sleep(1)
+    assert mint_status.status == "confirmed"
+    contract = Contract(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+    assert contract.owner_of(mint_status.token_id, verify=True) == to_address
+
+def test_put_tokens():
+    tools = get_tools(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+    put_tokens_tool = tools[4]
+    to_address = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+    rewards = [{"to_address": to_address, "token_name": f"Batch Token {i}"} for i in range(3)]
+    results = put_tokens_tool.invoke({"rewards": rewards})
+    assert [result.token_name for result in results] == [reward["token_name"] for reward in rewards]
+    for result in results:
+        assert result.error is None
+        assert result.token_id != -1
+    assert len({result.token_id for result in results}) == len(rewards)
+    contract = Contract(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+    for result in results:
+        assert contract.owner_of(result.token_id, verify=True) == to_address
     
 def test_fetch_token():
     tools = get_tools(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
     fetch_token_tool = tools[1]
-    tokens = fetch_token_tool.invoke({"address": "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"})
+    address = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+    tokens = fetch_token_tool.invoke({"address": address})
     print(tokens)
     assert type(tokens) == list
     assert len(tokens) > 0
     for token in tokens:
         assert type(token) == Token
+        assert address in (token.from_address, token.to_address)
+
+def test_get_token_names():
+    contract = Contract(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+    tokens = contract.fetch_tokens()
+    token_ids = [token.token_id for token in tokens] * 2
+    names = contract.get_token_names(token_ids)
+    assert len(names) == len(set(token_ids))
+    for token in tokens:
+        assert names[token.token_id] == token.token_name
+
+def test_iter_tokens_streams(tmp_path):
+    # Scan a cold index in small pages and hold the scan after the first page with transfers until a token is received
+    contract = Contract(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY, cache_dir=str(tmp_path))
+    contract.scanner.window = 5
+    contract.scanner.max_workers = 1
+    scan = contract.scanner.scan
+    received = threading.Event()
+
+    def scan_until_received(from_block, to_block):
+        for last_block, logs in scan(from_block, to_block):
+            yield last_block, logs
+            if len(logs) > 0:
+                assert received.wait(10), "no token was yielded before the scan finished"
+                return
+
+    contract.scanner.scan = scan_until_received
+    tokens = contract.iter_tokens()
+    first = next(tokens)
+    received.set()
+    streamed = [first] + list(tokens)
+    assert streamed == list(contract._iter_index_tokens(None, 500, 0, contract.index.get_last_block()))
+
+def test_refresh_renamed_token_names(monkeypatch):
+    contract = Contract(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+    token = contract.fetch_tokens()[-1]
+    # Keep only the name of the token to rename in the cache
+    monkeypatch.setattr(contract, "token_names", TokenNameCache(":memory:"))
+    contract.get_token_names([token.token_id])
+    tx_hash = contract.send_transaction(contract.contract.functions.setTokenName(token.token_id, "Renamed Token"))
+    contract.wait_for_receipt(tx_hash)
+
+    # The gap is too long to scan the blocks, so the cached names are read again
+    monkeypatch.setattr("tools.contract.RENAME_SCAN_MAX_BLOCKS", 0)
+    monkeypatch.setattr(contract, "find_renamed_tokens", lambda *args: pytest.fail("the blocks were scanned"))
+    contract.sync_index()
+    assert contract.get_token_name(token.token_id) == "Renamed Token"
+
+def test_follower(wait_until):
+    contract = Contract(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+    contract.start_follower(poll_interval=0.2)
+    try:
+        tools = get_tools(rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS, private_key=PRIVATE_KEY)
+        token_id = tools[0].invoke({"to_address": "0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "token_name": "Follower Token"})
+        # The follower merges the new block in the background
+        wait_until(lambda: token_id in [token.token_id for token in contract.fetch_tokens("0x70997970C51812dc3A010C7d01b50e0d17dc79C8")])
+    finally:
+        contract.stop_follower()
 
 @pytest.mark.parametrize("token_list,token,reason,owner,expected_contains", [
     (
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+from tools.tool_cache import ToolResultCache
+from tools.transfer_follower import TransferFollower
+
+class IndexStub:
+    def get_last_block(self) -> int:
+        return 0
+
+class ContractStub:
+    """
+    Stub of Contract whose sync_index waits until it is released.
+    """
+    def __init__(self):
+        self.index = IndexStub()
+        self.tool_cache = ToolResultCache()
+        self.syncing = threading.Event()
+        self.release = threading.Event()
+
+    def sync_index(self) -> int:
+        self.syncing.set()
+        self.release.wait()
+        return 0
+
+async def follow_forever():
+    await asyncio.Event().wait()
+
+def test_stop_before_subscription():
+    contract = ContractStub()
+    follower = TransferFollower(contract, ws_url="ws://127.0.0.1:9")
+    follower._follow_subscription = follow_forever
+    follower.thread.start()
+    contract.syncing.wait()
+
+    # Stop while the follower catches up, before it subscribes
+    stopping = threading.Thread(target=follower.stop, daemon=True)
+    stopping.start()
+    follower.stop_event.wait()
+    contract.release.set()
+    stopping.join(timeout=5)
+    assert not stopping.is_alive()
+    assert not follower.thread.is_alive()
+
+def test_stop_while_subscribed(wait_until):
+    contract = ContractStub()
+    contract.release.set()
+    follower = TransferFollower(contract, ws_url="ws://127.0.0.1:9")
+    follower._follow_subscription = follow_forever
+    follower.start()
+    wait_until(lambda: follower.loop is not None)
+    follower.stop()
+    assert not follower.thread.is_alive()
@@ -0,0 +1,255 @@
+from concurrent.futures import Future
+from typing import Callable
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TimeExhausted, Web3RPCError
+from tools.tx_outbox import TransactionOutbox
+
+class FunctionsStub:
+    def safeMint(self, to_address, token_name):
+        return (to_address, token_name)
+
+class ContractFunctionsStub:
+    def __init__(self):
+        self.functions = FunctionsStub()
+
+class AccountStub:
+    address = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+
+class ContractStub:
+    """
+    Stub of Contract that records the signed, sent and watched transactions and resolves the receipts by hand.
+    """
+    def __init__(self, w3, send_errors: int = 0, send_error: Exception = Exception("connection refused")):
+        self.w3 = w3
+        self.account = AccountStub()
+        self.contract = ContractFunctionsStub()
+        self.send_errors = send_errors
+        self.send_error = send_error
+        self.signed = []
+        self.sent = []
+        self.watched = []
+        self.receipts = {}
+
+    def sign_transaction(self, contract_function):
+        self.signed.append(contract_function)
+        return {"nonce": len(self.signed)}, HexBytes(f"{contract_function[1]}-{len(self.signed)}".encode())
+
+    def send_raw_transaction(self, tx, raw_transaction, on_replace=None, replaced=()):
+        if self.send_errors > 0:
+            self.send_errors -= 1
+            raise self.send_error
+        self.sent.append(raw_transaction)
+        tx_hash = Web3.keccak(raw_transaction)
+        self.watch_transaction(tx, tx_hash, on_replace, replaced)
+        return tx_hash
+
+    def watch_transaction(self, tx, tx_hash, on_replace=None, replaced=()):
+        self.watched.append((tx, HexBytes(tx_hash), on_replace, list(replaced)))
+        return self.track_receipt(tx_hash)
+
+    def track_receipt(self, tx_hash):
+        return self.receipts.setdefault(HexBytes(tx_hash), Future())
+
+    def apply_receipt(self, tx_receipt):
+        pass
+
+def mined(tx_hash, token_id: int):
+    return {"transactionHash": HexBytes(tx_hash), "status": 1, "logs": [{"topics": [b"", b"", b"", token_id.to_bytes(32, "big")]}]}
+
+def wait_for_status(wait_until: Callable, outbox: TransactionOutbox, tracking_id: str, status: str):
+    wait_until(lambda: outbox.get_status(tracking_id).status == status)
+    return outbox.get_status(tracking_id)
+
+def wait_for_receipt(wait_until: Callable, contract: ContractStub, tx_hash) -> Future:
+    wait_until(lambda: HexBytes(tx_hash) in contract.receipts)
+    return contract.receipts[HexBytes(tx_hash)]
+
+def test_enqueue_and_confirm(w3, wait_until):
+    contract = ContractStub(w3)
+    outbox = TransactionOutbox(contract, ":memory:", poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    assert outbox.get_status(tracking_id).status in ("queued", "sent")
+
+    sent = wait_for_status(wait_until, outbox, tracking_id, "sent")
+    assert HexBytes(sent.tx_hash) == Web3.keccak(contract.sent[0])
+    wait_for_receipt(wait_until, contract, sent.tx_hash).set_result(mined(sent.tx_hash, 7))
+    confirmed = wait_for_status(wait_until, outbox, tracking_id, "confirmed")
+    assert confirmed.token_id == 7
+    assert outbox.get_status("unknown") is None
+    outbox.stop()
+
+def test_send_error_resends_same_transaction(w3, wait_until):
+    # The node may have accepted the transaction before the error, so the same bytes are sent again
+    contract = ContractStub(w3, send_errors=2)
+    outbox = TransactionOutbox(contract, ":memory:", poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    wait_until(lambda: len(contract.sent) > 0)
+    sent = outbox.get_status(tracking_id)
+    assert sent.status == "sent"
+    assert len(contract.signed) == 1
+    assert HexBytes(sent.tx_hash) == Web3.keccak(contract.sent[0])
+    outbox.stop()
+
+def test_send_error_with_used_nonce(w3, wait_until):
+    # The chain used the nonce, so the receipt of the journaled transaction confirms the reward instead of signing again
+    contract = ContractStub(w3, send_errors=1)
+    w3.eth.transaction_count = {"latest": 2, "pending": 2}
+    tx_hash = Web3.keccak(b"Test Token-1")
+    w3.eth.receipts[tx_hash] = mined(tx_hash, 9)
+    outbox = TransactionOutbox(contract, ":memory:", poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    assert wait_for_status(wait_until, outbox, tracking_id, "confirmed").token_id == 9
+    assert len(contract.signed) == 1
+    assert contract.sent == []
+    outbox.stop()
+
+def test_nonce_used_by_another_transaction(w3, wait_until):
+    contract = ContractStub(w3, send_errors=1)
+    w3.eth.transaction_count = {"latest": 2, "pending": 2}
+    outbox = TransactionOutbox(contract, ":memory:", poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    assert wait_for_status(wait_until, outbox, tracking_id, "failed").error == "Nonce 1 was used by another transaction"
+    outbox.stop()
+
+def test_rejected_then_fail(w3, wait_until):
+    # The node rejects the transaction and the nonce is unused, so a new one is signed until max_attempts
+    contract = ContractStub(w3, send_errors=10, send_error=Web3RPCError("insufficient funds"))
+    outbox = TransactionOutbox(contract, ":memory:", max_attempts=3, poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    failed = wait_for_status(wait_until, outbox, tracking_id, "failed")
+    assert failed.attempts == 3
+    assert failed.error == "insufficient funds"
+    assert len(contract.signed) == 3
+    outbox.stop()
+
+def test_resume_unjournaled(w3, tmp_path, wait_until):
+    # The process stopped after the reward was marked as sent but before its transaction was journaled
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = TransactionOutbox(ContractStub(w3), path, poll_interval=0.01)
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    outbox._update(tracking_id, status="sent", attempts=1, nonce=1)
+
+    # Nothing was sent, so a new transaction is signed and the worker keeps running
+    contract = ContractStub(w3)
+    outbox = TransactionOutbox(contract, path, poll_interval=0.01)
+    outbox.start()
+    wait_until(lambda: len(contract.sent) == 1)
+    sent = outbox.get_status(tracking_id)
+    assert (sent.status, sent.attempts) == ("sent", 2)
+    assert HexBytes(sent.tx_hash) == Web3.keccak(contract.sent[0])
+    other_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Other Token")
+    wait_for_status(wait_until, outbox, other_id, "sent")
+    assert outbox.thread.is_alive()
+    outbox.stop()
+
+def test_journal_error_keeps_worker(w3, wait_until):
+    contract = ContractStub(w3)
+    outbox = TransactionOutbox(contract, ":memory:", poll_interval=0.01)
+    journal = outbox._journal
+    errors = [Exception("disk I/O error")]
+
+    def failing_journal(*args, **values):
+        if errors:
+            raise errors.pop()
+        journal(*args, **values)
+
+    outbox._journal = failing_journal
+    outbox.start()
+    # Nothing was written, so the reward stays queued and is signed again in the next round
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    sent = wait_for_status(wait_until, outbox, tracking_id, "sent")
+    assert len(contract.signed) == 2
+    assert HexBytes(sent.tx_hash) == Web3.keccak(contract.sent[0])
+    assert outbox.thread.is_alive()
+    outbox.stop()
+
+def test_resume_after_restart(w3, tmp_path, wait_until):
+    path = str(tmp_path / "outbox.sqlite3")
+    contract = ContractStub(w3)
+    outbox = TransactionOutbox(contract, path, poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    sent = wait_for_status(wait_until, outbox, tracking_id, "sent")
+    outbox.stop()
+
+    # The journaled transaction is sent again and watched instead of signing a new one
+    contract = ContractStub(w3)
+    outbox = TransactionOutbox(contract, path, poll_interval=0.01)
+    outbox.start()
+    receipt = wait_for_receipt(wait_until, contract, sent.tx_hash)
+    assert contract.signed == []
+    assert [Web3.keccak(raw_transaction) for raw_transaction in contract.sent] == [HexBytes(sent.tx_hash)]
+    assert contract.watched[0][1] == HexBytes(sent.tx_hash)
+    receipt.set_result(mined(sent.tx_hash, 8))
+    assert wait_for_status(wait_until, outbox, tracking_id, "confirmed").token_id == 8
+    outbox.stop()
+
+def test_resume_replacement(w3, tmp_path, wait_until):
+    path = str(tmp_path / "outbox.sqlite3")
+    contract = ContractStub(w3)
+    outbox = TransactionOutbox(contract, path, poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    first = wait_for_status(wait_until, outbox, tracking_id, "sent")
+    wait_for_receipt(wait_until, contract, first.tx_hash)
+    # The watchdog journals a replacement with bumped fees
+    on_replace = contract.watched[0][2]
+    replacement = HexBytes(b"Test Token-1-bumped")
+    on_replace({"nonce": 1, "bumped": True}, replacement, Web3.keccak(replacement))
+    outbox.stop()
+
+    # The replacement was mined, so the nonce is used and its receipt confirms the reward without sending anything
+    contract = ContractStub(w3)
+    w3.eth.transaction_count = {"latest": 2, "pending": 2}
+    w3.eth.receipts[Web3.keccak(replacement)] = mined(Web3.keccak(replacement), 5)
+    outbox = TransactionOutbox(contract, path, poll_interval=0.01)
+    outbox.start()
+    confirmed = wait_for_status(wait_until, outbox, tracking_id, "confirmed")
+    assert (confirmed.token_id, HexBytes(confirmed.tx_hash)) == (5, Web3.keccak(replacement))
+    assert contract.signed == [] and contract.sent == []
+    outbox.stop()
+
+def test_resume_pending_replacement(w3, tmp_path, wait_until):
+    path = str(tmp_path / "outbox.sqlite3")
+    contract = ContractStub(w3)
+    outbox = TransactionOutbox(contract, path, poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    first = wait_for_status(wait_until, outbox, tracking_id, "sent")
+    wait_for_receipt(wait_until, contract, first.tx_hash)
+    replacement = HexBytes(b"Test Token-1-bumped")
+    contract.watched[0][2]({"nonce": 1, "bumped": True}, replacement, Web3.keccak(replacement))
+    outbox.stop()
+
+    # The node already has the replacement, so it is watched with every journaled version
+    contract = ContractStub(w3, send_errors=1, send_error=Web3RPCError("already known"))
+    w3.eth.transaction_count = {"latest": 1, "pending": 2}
+    outbox = TransactionOutbox(contract, path, poll_interval=0.01)
+    outbox.start()
+    receipt = wait_for_receipt(wait_until, contract, Web3.keccak(replacement))
+    tx, tx_hash, _, replaced = contract.watched[0]
+    assert (tx, tx_hash, replaced) == ({"nonce": 1, "bumped": True}, Web3.keccak(replacement), [HexBytes(first.tx_hash)])
+    receipt.set_result(mined(Web3.keccak(replacement), 6))
+    assert wait_for_status(wait_until, outbox, tracking_id, "confirmed").token_id == 6
+    outbox.stop()
+
+def test_timeout_checks_nonce(w3, wait_until):
+    contract = ContractStub(w3)
+    outbox = TransactionOutbox(contract, ":memory:", poll_interval=0.01)
+    outbox.start()
+    tracking_id = outbox.enqueue("0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "Test Token")
+    sent = wait_for_status(wait_until, outbox, tracking_id, "sent")
+    receipt = wait_for_receipt(wait_until, contract, sent.tx_hash)
+    # The nonce is unused after the timeout, so the transaction is sent again instead of failing
+    del contract.receipts[HexBytes(sent.tx_hash)]
+    receipt.set_exception(TimeExhausted("timeout"))
+    wait_for_receipt(wait_until, contract, sent.tx_hash).set_result(mined(sent.tx_hash, 3))
+    assert wait_for_status(wait_until, outbox, tracking_id, "confirmed").token_id == 3
+    assert len(contract.signed) == 1 and len(contract.sent) == 2
+    outbox.stop()
@@ -0,0 +1,69 @@
+import json
+from concurrent.futures import Future
+from hexbytes import HexBytes
+from web3 import Web3
+from tools.tx_watchdog import TransactionWatchdog
+
+class SignedStub:
+    def __init__(self, tx):
+        self.raw_transaction = HexBytes(json.dumps(tx).encode())
+
+class AccountStub:
+    def sign_transaction(self, tx):
+        return SignedStub(tx)
+
+class ReceiptsStub:
+    """
+    Stub of the receipt tracker that records the replacements.
+    """
+    def __init__(self):
+        self.future = Future()
+        self.replacements = []
+
+    def track(self, tx_hash):
+        return self.future
+
+    def replace(self, tx_hash, new_tx_hash):
+        self.replacements.append((tx_hash, new_tx_hash))
+
+class FeesStub:
+    def __init__(self, max_fee: int, priority_fee: int):
+        self.fees = (max_fee, priority_fee)
+
+    def get_fees(self):
+        return self.fees
+
+def sent_transactions(w3):
+    return [json.loads(raw_transaction) for raw_transaction in w3.eth.sent]
+
+def test_replace_stuck_transaction(w3, wait_until):
+    receipts = ReceiptsStub()
+    watchdog = TransactionWatchdog(w3, AccountStub(), receipts, FeesStub(100, 10), stuck_after=0.05, max_bumps=2)
+    tx = {"nonce": 7, "maxFeePerGas": 1000, "maxPriorityFeePerGas": 100}
+    journaled = []
+    watchdog.watch(tx, HexBytes(0), on_replace=lambda *version: journaled.append((version, len(w3.eth.sent))))
+    wait_until(lambda: len(receipts.replacements) == 2)
+
+    # The transaction is replaced with the same nonce and bumped fees up to max_bumps times
+    sent = sent_transactions(w3)
+    assert [tx["nonce"] for tx in sent] == [7, 7]
+    assert [(tx["maxFeePerGas"], tx["maxPriorityFeePerGas"]) for tx in sent] == [(1125, 113), (1266, 128)]
+    tx_hashes = [version[2] for version, _ in journaled]
+    assert receipts.replacements == [(HexBytes(0), tx_hashes[0]), (tx_hashes[0], tx_hashes[1])]
+    # Each replacement is passed to on_replace before it is sent
+    assert [(version[0], Web3.keccak(version[1]), sent_count) for version, sent_count in journaled] == [
+        (sent[0], tx_hashes[0], 0),
+        (sent[1], tx_hashes[1], 1),
+    ]
+
+    # The transaction is forgotten when one of the versions is mined
+    receipts.future.set_result({"status": 1})
+    assert watchdog.entries == {}
+    wait_until(lambda: watchdog.thread is None)
+
+def test_bump_to_market_fees(w3, wait_until):
+    watchdog = TransactionWatchdog(w3, AccountStub(), ReceiptsStub(), FeesStub(5000, 500), stuck_after=0.05, max_bumps=1)
+    watchdog.watch({"nonce": 0, "maxFeePerGas": 1000, "maxPriorityFeePerGas": 100}, HexBytes(0))
+    wait_until(lambda: len(w3.eth.sent) == 1)
+    sent = sent_transactions(w3)
+    assert (sent[0]["maxFeePerGas"], sent[0]["maxPriorityFeePerGas"]) == (5000, 500)
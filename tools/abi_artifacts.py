@@ -0,0 +1,89 @@
+from functools import lru_cache
+from typing import Dict, List
+from eth_utils import abi_to_signature, event_abi_to_log_topic, function_abi_to_4byte_selector
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from tools.ssdlab_token_abi import abi
+
+@lru_cache(maxsize=None)
+def get_function_selectors() -> Dict[str, HexBytes]:
+    """
+    Get the 4-byte selector of each function in the ABI by its signature, e.g. "setTokenName(uint256,string)".
+    The selectors are computed once per process.
+    """
+    return {
+        abi_to_signature(entry): HexBytes(function_abi_to_4byte_selector(entry))
+        for entry in abi
+        if entry["type"] == "function"
+    }
+
+@lru_cache(maxsize=None)
+def get_event_topics() -> Dict[str, HexBytes]:
+    """
+    Get the topic of each event in the ABI. The topics are computed once per process.
+    """
+    return {
+        entry["name"]: HexBytes(event_abi_to_log_topic(entry))
+        for entry in abi
+        if entry["type"] == "event"
+    }
+
+@lru_cache(maxsize=65536)
+def _topic_to_address(topic: bytes) -> str:
+    # The same addresses appear in many logs, so their checksums are cached
+    return Web3.to_checksum_address(topic[-20:])
+
+def decode_transfer_log(log) -> AttributeDict:
+    """
+    Decode a raw Transfer log into the same shape as the event data of web3.
+    All the arguments of Transfer are indexed, so they are read from the topics without the generic ABI decoder.
+    """
+    topics = log["topics"]
+    return AttributeDict({
+        "args": AttributeDict({
+            "from": _topic_to_address(bytes(topics[1])),
+            "to": _topic_to_address(bytes(topics[2])),
+            "tokenId": int.from_bytes(topics[3], "big"),
+        }),
+        "event": "Transfer",
+        "logIndex": log["logIndex"],
+        "transactionIndex": log["transactionIndex"],
+        "transactionHash": log["transactionHash"],
+        "address": log["address"],
+        "blockHash": log["blockHash"],
+        "blockNumber": log["blockNumber"],
+    })
+
+class TransferEvent:
+    """
+    Transfer event of the contract decoded with the precomputed topic.
+    It can replace contract.events.Transfer() for get_logs and process_receipt.
+    """
+
+    def __init__(self, w3, address: str):
+        self.w3 = w3
+        self.address = address
+        self.topic = get_event_topics()["Transfer"]
+
+    def _is_transfer(self, log) -> bool:
+        return (
+            log["address"] == self.address
+            and len(log["topics"]) == 4
+            and HexBytes(log["topics"][0]) == self.topic
+        )
+
+    def get_logs(self, from_block: int, to_block: int) -> List[AttributeDict]:
+        logs = self.w3.eth.get_logs({
+            "address": self.address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [self.topic.to_0x_hex()],
+        })
+        return [decode_transfer_log(log) for log in logs if self._is_transfer(log)]
+
+    def process_receipt(self, tx_receipt) -> List[AttributeDict]:
+        """
+        Decode the Transfer logs of the contract in the receipt and skip the other logs.
+        """
+        return [decode_transfer_log(log) for log in tx_receipt["logs"] if self._is_transfer(log)]
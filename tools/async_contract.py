@@ -0,0 +1,181 @@
+import asyncio
+from typing import Dict, Iterable, List
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+from tools.ssdlab_token_abi import abi
+from tools.contract import RPC_BATCH_SIZE, Contract
+from components.model import MintResult, Reward, Token
+
+class AsyncContract:
+    """
+    Async chain client of a Contract for the event loop.
+    It shares the index, the name cache, the nonces, the fee oracle, the watchdog and the receipt tracker with the Contract,
+    and awaits the RPC requests and the receipts instead of blocking, so several tool calls can overlap on one event loop.
+    The work that holds the locks of the Contract or reads SQLite, e.g. signing and syncing the index, runs in a worker thread.
+    The results are built by the same helpers of the Contract as the sync client.
+    """
+
+    def __init__(self, contract: Contract):
+        self.contract = contract
+
+    def get_address(self) -> str:
+        return self.contract.get_address()
+
+    async def mint(self, to_address: str, token_name: str) -> int:
+        """
+        Mint a NFT to the specified address and return its token ID, or -1 on error.
+        """
+        result = MintResult(to_address=to_address, token_name=token_name)
+        try:
+            tx_hash = await self.send_transaction(self.contract.contract.functions.safeMint(to_address, token_name))
+            tx_receipt = await self.wait_for_receipt(tx_hash)
+        except Exception as e:
+            print(f"Error minting token: {e}")
+            return -1
+        await asyncio.to_thread(self.contract.apply_mint_receipt, result, tx_hash, tx_receipt)
+        if result.error is not None:
+            print(f"Error minting token: {result.error}")
+        return result.token_id
+
+    async def mint_batch(self, rewards: List[Reward]) -> List[MintResult]:
+        """
+        Mint NFTs for many rewards at once and return the result of each reward in the same order.
+        The transactions are sent in nonce order, then all the receipts are awaited together.
+        """
+        results = [MintResult(to_address=reward.to_address, token_name=reward.token_name) for reward in rewards]
+
+        tx_hashes = {}
+        for i, reward in enumerate(rewards):
+            try:
+                tx_hashes[i] = await self.send_transaction(
+                    self.contract.contract.functions.safeMint(reward.to_address, reward.token_name)
+                )
+            except Exception as e:
+                results[i].error = f"Error sending transaction: {e}"
+
+        receipts = await asyncio.gather(
+            *(self.wait_for_receipt(tx_hash) for tx_hash in tx_hashes.values()),
+            return_exceptions=True,
+        )
+        for i, tx_receipt in zip(tx_hashes, receipts):
+            if isinstance(tx_receipt, Exception):
+                results[i].error = f"Error waiting for transaction: {tx_receipt}"
+                continue
+            await asyncio.to_thread(self.contract.apply_mint_receipt, results[i], tx_hashes[i], tx_receipt)
+        return results
+
+    async def transfer(self, from_address: str, to_address: str, token_id: int, verify_owner: bool = False) -> None:
+        """
+        Transfer a NFT from one address to another.
+        """
+        await asyncio.to_thread(self.contract.check_owner, from_address, token_id, verify_owner)
+
+        tx_hash = await self.send_transaction(
+            self.contract.contract.functions.safeTransferFrom(from_address, to_address, token_id)
+        )
+        tx_receipt = await self.wait_for_receipt(tx_hash)
+        await asyncio.to_thread(self.contract.apply_receipt, tx_receipt)
+
+    async def send_transaction(self, contract_function) -> HexBytes:
+        """
+        Sign and send a transaction for the contract function without waiting for it to be mined.
+        """
+        w3 = await self.contract.get_async_web3()
+        # Send the transactions of the coroutines in nonce order, the node may reject a nonce gap
+        async with self.contract.get_async_send_lock():
+            # The nonce is allocated under the lock of the nonce manager and the fees may be read from the chain
+            tx, raw_transaction = await asyncio.to_thread(self.contract.sign_transaction, contract_function)
+            try:
+                tx_hash = await w3.eth.send_raw_transaction(raw_transaction)
+            except Exception:
+                # The nonce may not have been used, so read it from the chain again
+                await asyncio.to_thread(self.contract.nonces.resync, tx["nonce"])
+                raise
+            self.contract.nonces.release(tx["nonce"])
+
+        self.contract.tool_cache.invalidate()
+        self.contract.watch_transaction(tx, tx_hash)
+        return tx_hash
+
+    async def get_block_number(self) -> int:
+        """
+        Get the number of the latest block.
+        """
+        w3 = await self.contract.get_async_web3()
+        return await w3.eth.block_number
+
+    async def wait_for_receipt(self, tx_hash: HexBytes):
+        """
+        Wait for the transaction to be mined without blocking the event loop and return the receipt.
+        """
+        try:
+            return await self.contract.receipts.track_async(tx_hash)
+        except TimeExhausted:
+            # The transaction may have been dropped, so read the nonce from the chain again
+            await asyncio.to_thread(self.contract.nonces.resync)
+            raise
+
+    async def get_token_names(self, token_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Resolve the names of the given tokens from the cache and JSON-RPC batch requests for the rest.
+        """
+        names, unique_ids = await asyncio.to_thread(self.contract.get_cached_token_names, list(token_ids))
+        if len(unique_ids) == 0:
+            return names
+
+        w3 = await self.contract.get_async_web3()
+        for start in range(0, len(unique_ids), RPC_BATCH_SIZE):
+            chunk = unique_ids[start:start + RPC_BATCH_SIZE]
+            try:
+                results = await self._call_token_names(w3, chunk)
+            except Exception as e:
+                # Fall back to one call per token if the node does not support batch requests
+                print(f"Error resolving token names in batch: {e}")
+                contract = w3.eth.contract(address=self.contract.contract.address, abi=abi)
+                results = await asyncio.gather(
+                    *(contract.functions.getTokenName(token_id).call() for token_id in chunk)
+                )
+            names.update(zip(chunk, results))
+            await asyncio.to_thread(self.contract.token_names.put_many, dict(zip(chunk, results)))
+        return names
+
+    async def _call_token_names(self, w3, token_ids: List[int]) -> List[str]:
+        # The batch mode of AsyncWeb3 is set on the provider and would capture the requests of the other coroutines,
+        # so the calls are encoded and sent as one raw batch request
+        requests = [
+            ("eth_call", [{
+                "to": self.contract.contract.address,
+                "data": self.contract.contract.encode_abi("getTokenName", args=[token_id]),
+            }, "latest"])
+            for token_id in token_ids
+        ]
+        responses = await w3.provider.make_batch_request(requests)
+        if not isinstance(responses, list):
+            raise Exception(responses.get("error", responses))
+        results = []
+        for response in responses:
+            if "error" in response:
+                raise Exception(response["error"])
+            results.append(w3.codec.decode(["string"], HexBytes(response["result"]))[0])
+        return results
+
+    async def fetch_tokens(self, address: str | None = None, page_size: int = 500) -> List[Token]:
+        """
+        Fetch the tokens transferred from or to the address, or all the tokens if the address is None.
+        """
+        if address is not None:
+            address = Web3.to_checksum_address(address)
+        # The follower keeps the index up to date, so the chain is only read when it is not running
+        follower = self.contract.follower
+        if follower is None or not follower.is_running():
+            await asyncio.to_thread(self.contract.sync_index)
+
+        tokens = []
+        pages = self.contract.index.iter_transfers(address, page_size)
+        # The pages are read from SQLite in a worker thread, next() returns None after the last page
+        while (page := await asyncio.to_thread(next, pages, None)) is not None:
+            transfers = self.contract.filter_transfers(page)
+            names = await self.get_token_names(transfer["token_id"] for transfer in transfers)
+            tokens.extend(self.contract.build_tokens(transfers, names))
+        return tokens
@@ -1,29 +1,165 @@
-from typing import List
+import asyncio
+import inspect
+import os
+import queue
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+from hexbytes import HexBytes
 from web3 import Web3
+from web3.exceptions import TimeExhausted
 from eth_account import Account
 from tools.ssdlab_token_abi import abi
-from components.model import Token
+from tools.token_index import TokenIndex, ZERO_ADDRESS
+from tools.abi_artifacts import TransferEvent, get_function_selectors
+from tools.log_scanner import LogScanner
+from tools.token_name_cache import TokenNameCache
+from tools.transfer_follower import TransferFollower
+from tools.nonce_manager import get_nonce_manager
+from tools.receipt_tracker import ReceiptTracker
+from tools.fee_oracle import FeeOracle
+from tools.tx_watchdog import TransactionWatchdog
+from tools.tx_outbox import TransactionOutbox
+from tools.tool_cache import ToolResultCache
+from tools.rpc_transport import TransportConfig, get_async_web3, get_web3
+from components.model import MintResult, MintStatus, Reward, Token
+
+RPC_BATCH_SIZE = 100
+# Above this many new blocks, the cached token names are read again instead of scanning the full blocks for renames
+RENAME_SCAN_MAX_BLOCKS = 1000
 
 # This class is used to interact with a smart contract on the Ethereum blockchain.
 class Contract:
 
     # This function initializes the Contract class with the given RPC URL, contract address, and private key.
-    def __init__(self, rpc_url: str, contract_address: str, private_key: str):
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
+    # The Transfer events are indexed in a SQLite file under cache_dir so that they persist across runs.
+    # The events in the last confirmations blocks are not final and are rolled back if a reorg replaces their blocks.
+    # The transactions pending for longer than stuck_after seconds are replaced with bumped fees.
+    # The timeouts and the connection pool of the RPC endpoint are set by transport.
+    def __init__(
+        self,
+        rpc_url: str,
+        contract_address: str,
+        private_key: str,
+        cache_dir: str = ".cache",
+        confirmations: int = 12,
+        stuck_after: float = 30.0,
+        transport: TransportConfig = TransportConfig(),
+    ):
+        # Share the pooled keep-alive connections of the endpoint with the other clients and threads
+        # Cache the chain ID so that each contract call does not send an extra eth_chainId request
+        self.w3 = get_web3(rpc_url, transport, cache_allowed_requests=True, cacheable_requests={"eth_chainId"})
+        self.rpc_url = rpc_url
+        self.transport = transport
+        # The AsyncWeb3 instances by event loop, see get_async_web3()
+        self.async_w3 = {}
+        self.async_w3_lock = threading.Lock()
         self.contract = None
         self.account = None
+        self.scanner = None
+        self.transfer_event = None
+        self.nonces = None
         self.private_key = private_key
+        self.confirmations = confirmations
+        self.cache_dir = cache_dir
+        index_path = os.path.join(cache_dir, f"{contract_address.lower()}.sqlite3")
+        self.index = TokenIndex(path=index_path, contract_address=contract_address)
+        self.token_names = TokenNameCache(path=index_path)
+        self.sync_lock = threading.Lock()
+        self.follower = None
+        # The tracker batches requests from its own thread, so it needs its own Web3 instance
+        self.receipts = ReceiptTracker(get_web3(rpc_url, transport), batch_size=RPC_BATCH_SIZE)
+        self.fees = FeeOracle(self.w3)
+        self.watchdog = None
+        self.outbox = None
+        # The results of the read-only tools, dropped when we send a transaction or a new block arrives
+        self.tool_cache = ToolResultCache()
+        # The connection is checked on the first use, see connect()
+        self.connected = False
+        self.connect_lock = threading.Lock()
+        self.local = threading.local()
+        # The async clients of all the tool sets send through one lock per event loop, see get_async_send_lock()
+        self.async_send_locks = weakref.WeakKeyDictionary()
+        self.async_send_locks_lock = threading.Lock()
         
-        # Connect to the Ethereum network
-        if not self.w3.is_connected():
-            raise Exception("Failed to connect to the Ethereum network")
         if self.private_key is None:
             raise Exception("Private key is None")
         else:
             # create contract instance
             self.contract = self.w3.eth.contract(address=contract_address, abi=abi)
+            # create log scanner for the Transfer events, decoded with the precomputed topic
+            self.transfer_event = TransferEvent(self.w3, self.contract.address)
+            self.scanner = LogScanner(self.transfer_event)
             # create account instance
             self.account = Account.from_key(private_key)
+            # share the nonce manager of the account with the other clients
+            self.nonces = get_nonce_manager(self.w3, self.account.address)
+            # create watchdog for the stuck transactions
+            self.watchdog = TransactionWatchdog(self.w3, self.account, self.receipts, self.fees, stuck_after=stuck_after)
+
+    # This function checks the connection to the Ethereum network once, on the first use of the client.
+    def connect(self) -> None:
+        if self.connected:
+            return
+        with self.connect_lock:
+            if not self.connected:
+                if not self.w3.is_connected():
+                    raise Exception("Failed to connect to the Ethereum network")
+                self.connected = True
+
+    # This function returns a Web3 instance and a contract instance for batch requests from the current thread.
+    # The batch mode of web3 is set on the provider, so the threads sharing this client must not batch on self.w3.
+    def get_batch_client(self):
+        if getattr(self.local, "w3", None) is None:
+            self.local.w3 = get_web3(self.rpc_url, self.transport)
+            self.local.contract = self.local.w3.eth.contract(address=self.contract.address, abi=abi)
+        return self.local.w3, self.local.contract
+
+    # This function returns an AsyncWeb3 instance on the same endpoint for the running event loop.
+    # It keeps its own pool of keep-alive connections and is created once per event loop, so the threads with their own loops do not share it.
+    # Its session is closed when the loop shuts down its async generators (e.g. at the end of asyncio.run),
+    # and the instances of the loops closed without shutting down are disconnected on the next call.
+    async def get_async_web3(self):
+        loop = asyncio.get_running_loop()
+        with self.async_w3_lock:
+            entry = self.async_w3.get(loop)
+            stale = [self.async_w3.pop(other) for other in list(self.async_w3) if other.is_closed()]
+        for _, closer in stale:
+            try:
+                await closer.aclose()
+            except Exception as e:
+                print(f"Error closing the session of a closed event loop: {e}")
+        if entry is not None:
+            return entry[0]
+
+        w3 = await get_async_web3(self.rpc_url, self.transport)
+        closer = self._close_on_shutdown(w3)
+        with self.async_w3_lock:
+            entry = self.async_w3.setdefault(loop, (w3, closer))
+        if entry[0] is not w3:
+            # Another coroutine of the loop created one meanwhile
+            await w3.provider.disconnect()
+            return entry[0]
+        # Start the generator, so that the loop closes it on shutdown
+        await closer.__anext__()
+        return w3
+
+    # This function disconnects the AsyncWeb3 instance when the generator is closed.
+    async def _close_on_shutdown(self, w3):
+        try:
+            yield
+        finally:
+            await w3.provider.disconnect()
+
+    # This function returns the lock that keeps the coroutines of the event loop sending their transactions in nonce order.
+    # The lock is on the shared client, so the async clients of different tool sets do not interleave their sends.
+    def get_async_send_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        with self.async_send_locks_lock:
+            if loop not in self.async_send_locks:
+                self.async_send_locks[loop] = asyncio.Lock()
+            return self.async_send_locks[loop]
 
     # This function returns the address of the account.
     def get_address(self) -> str:
@@ -32,67 +168,423 @@ class Contract:
 
     # This function mints a NFT to the specified address.
     def mint(self, to_address: str, token_name: str) -> int:
-        # Call the mint function for smart contract
-        nonce = self.w3.eth.get_transaction_count(self.account.address)
-        tx = self.contract.functions.safeMint(to_address, token_name).build_transaction({
-            'chainId': 31337,
-            'gas': 200000,
-            "maxFeePerGas": self.w3.to_wei(2, 'gwei'),
-            "maxPriorityFeePerGas": self.w3.to_wei(2, 'gwei'),
-            'nonce': nonce,
-        })
-        
+        result = MintResult(to_address=to_address, token_name=token_name)
         try:
-            # Sign and send the transaction
-            signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            # Call the mint function for smart contract
+            tx_hash = self.send_transaction(self.contract.functions.safeMint(to_address, token_name))
             
             # Wait for the transaction to be mined and get the transaction receipt to extract the token ID
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            token_id = tx_receipt.logs[0].topics[3].hex()
-
-            return int(token_id, 16)
+            tx_receipt = self.wait_for_receipt(tx_hash)
         except Exception as e:
             print(f"Error minting token: {e}")
             return -1
+        self.apply_mint_receipt(result, tx_hash, tx_receipt)
+        if result.error is not None:
+            print(f"Error minting token: {result.error}")
+        return result.token_id
+
+    # This function mints NFTs for many rewards at once and returns the result of each reward in the same order.
+    # All the transactions are signed and sent up front with consecutive nonces, then the receipts are collected from the new blocks,
+    # so a batch is mined in about one block time instead of one block time per reward.
+    def mint_batch(self, rewards: List[Reward]) -> List[MintResult]:
+        results = [MintResult(to_address=reward.to_address, token_name=reward.token_name) for reward in rewards]
+
+        # Send all the transactions without waiting for them to be mined
+        tx_hashes = {}
+        for i, reward in enumerate(rewards):
+            try:
+                tx_hashes[i] = self.send_transaction(self.contract.functions.safeMint(reward.to_address, reward.token_name))
+            except Exception as e:
+                results[i].error = f"Error sending transaction: {e}"
+
+        # Follow all the transactions with the receipt tracker, then wait for them in order
+        receipts = {i: self.track_receipt(tx_hash) for i, tx_hash in tx_hashes.items()}
+        for i, future in receipts.items():
+            try:
+                tx_receipt = self.wait_for_receipt(tx_hashes[i], future)
+            except Exception as e:
+                results[i].error = f"Error waiting for transaction: {e}"
+                continue
+            self.apply_mint_receipt(results[i], tx_hashes[i], tx_receipt)
+        return results
+
+    # This function sets the token ID of the mint result from the receipt and applies the receipt to the index,
+    # or sets the error if the transaction reverted. It is shared with the async client.
+    def apply_mint_receipt(self, result: MintResult, tx_hash: HexBytes, tx_receipt) -> None:
+        if tx_receipt["status"] != 1:
+            result.error = f"Transaction {HexBytes(tx_hash).to_0x_hex()} reverted"
+            return
+        try:
+            self.apply_receipt(tx_receipt)
+            result.token_id = int(tx_receipt["logs"][0]["topics"][3].hex(), 16)
+        except Exception as e:
+            result.error = f"Error applying receipt: {e}"
 
     # This function transfers a NFT from one address to another.    
-    def transfer(self, from_address: str, to_address: str, token_id: str) -> None:
-        # check if the from_address is the owner of the token
-        if self.contract.functions.ownerOf(token_id).call() != from_address:
-            raise Exception("You are not the owner of this token")
+    def transfer(self, from_address: str, to_address: str, token_id: str, verify_owner: bool = False) -> None:
+        self.check_owner(from_address, token_id, verify_owner)
 
         # Call the transfer function for smart contract
-        nonce = self.w3.eth.get_transaction_count(self.account.address)
-        tx = self.contract.functions.safeTransferFrom(from_address, to_address, token_id).build_transaction({
-            'chainId': 31337,
-            'gas': 200000,
-            "maxFeePerGas": self.w3.to_wei(2, 'gwei'),
-            "maxPriorityFeePerGas": self.w3.to_wei(2, 'gwei'),
-            'nonce': nonce,
-        })
-
-        # Sign and send the transaction
-        signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.private_key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = self.send_transaction(self.contract.functions.safeTransferFrom(from_address, to_address, token_id))
         
-        # Wait for the transaction to be mined and get the transaction receipt to extract the token ID
-        self.w3.eth.wait_for_transaction_receipt(tx_hash)
-
-    # This function fetches all the tokens from the smart contract.
-    def fetch_tokens(self) -> List[Token]:
-        tokens: List[Token] = []
-        logs = self.contract.events.Transfer().get_logs(from_block=0)
-        for log in logs:
-            # check if the log is mint the NFT
-            if log["args"]["from"] == "0x0000000000000000000000000000000000000000":
-                continue
-            token = Token(
-                from_address=log["args"]["from"],
-                to_address=log["args"]["to"],
-                token_id=log["args"]["tokenId"],
-                token_name=self.contract.functions.getTokenName(log["args"]["tokenId"]).call()
+        # Wait for the transaction to be mined and apply the transfer to the index
+        tx_receipt = self.wait_for_receipt(tx_hash)
+        self.apply_receipt(tx_receipt)
+
+    # This function signs and sends a transaction for the contract function without waiting for it to be mined.
+    # The nonce is allocated locally, so several transactions can be in flight at the same time.
+    # The transaction is priced from the recent blocks for fast inclusion.
+    def send_transaction(self, contract_function) -> HexBytes:
+        tx, raw_transaction = self.sign_transaction(contract_function)
+        return self.send_raw_transaction(tx, raw_transaction)
+
+    # This function signs a transaction for the contract function with the next nonce and returns it with its raw bytes.
+    def sign_transaction(self, contract_function) -> Tuple[Dict, HexBytes]:
+        self.connect()
+        nonce = self.nonces.allocate()
+        try:
+            # The chain ID, gas and fees are cached by the fee oracle
+            tx = contract_function.build_transaction({
+                **self.fees.get_transaction_params(contract_function, self.account.address),
+                'nonce': nonce,
+            })
+            signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.private_key)
+            return tx, signed_tx.raw_transaction
+        except Exception:
+            # The nonce was not used, so read it from the chain again
+            self.nonces.resync(nonce)
+            raise
+
+    # This function sends a signed transaction and watches it until it is mined.
+    # on_replace is called with each replacement of the watchdog before it is sent, and replaced lists the hashes of the previous versions.
+    def send_raw_transaction(self, tx: Dict, raw_transaction: HexBytes, on_replace=None, replaced: Iterable[HexBytes] = ()) -> HexBytes:
+        try:
+            tx_hash = self.w3.eth.send_raw_transaction(raw_transaction)
+        except Exception:
+            # The nonce may not have been used, so read it from the chain again
+            self.nonces.resync(tx["nonce"])
+            raise
+
+        self.nonces.release(tx["nonce"])
+        self.tool_cache.invalidate()
+        self.watch_transaction(tx, tx_hash, on_replace, replaced)
+        return tx_hash
+
+    # This function watches a transaction that the node already has, e.g. one sent before a restart, and returns the future of its receipt.
+    # The transaction is replaced with bumped fees if it gets stuck.
+    def watch_transaction(self, tx: Dict, tx_hash: HexBytes, on_replace=None, replaced: Iterable[HexBytes] = ()) -> Future:
+        return self.watchdog.watch(tx, tx_hash, on_replace, replaced)
+
+    # This function returns a future that resolves to the receipt when the transaction is mined, without blocking.
+    # The receipts of all the pending transactions are resolved from the new blocks by one background thread.
+    # If the transaction was replaced by the watchdog, the receipt is the one of the mined version.
+    def track_receipt(self, tx_hash: HexBytes) -> Future:
+        return self.receipts.track(tx_hash)
+
+    # This function waits for the transaction to be mined and returns the receipt.
+    def wait_for_receipt(self, tx_hash: HexBytes, future: Future | None = None):
+        try:
+            return (future or self.track_receipt(tx_hash)).result()
+        except TimeExhausted:
+            # The transaction may have been dropped, so read the nonce from the chain again
+            self.nonces.resync()
+            raise
+
+    # This function applies the Transfer events in the receipt of our own transaction to the index.
+    # The checkpoint does not move, and the transfers are replaced when sync_index scans their block.
+    def apply_receipt(self, tx_receipt) -> None:
+        # The receipt is in a block that replaced an indexed one, so roll back the reorg first
+        recorded_hash = self.index.get_block_hashes().get(tx_receipt["blockNumber"])
+        if recorded_hash is not None and recorded_hash != tx_receipt["blockHash"].to_0x_hex():
+            with self.sync_lock:
+                self.rollback_reorg(self.w3.eth.block_number)
+        logs = self.transfer_event.process_receipt(tx_receipt)
+        self.index.add_transfers(logs, -1)
+        self.tool_cache.invalidate()
+
+    # This function returns the number of the latest block.
+    def get_block_number(self) -> int:
+        self.connect()
+        return self.w3.eth.block_number
+
+    # This function returns the owner of the token from the index.
+    # If the token is not indexed yet, the index is synced first. If verify is True, the owner is read from the chain.
+    def owner_of(self, token_id: int, verify: bool = False) -> str:
+        self.connect()
+        if verify:
+            return self.contract.functions.ownerOf(token_id).call()
+        owner = self.index.get_owner(token_id)
+        if owner is None:
+            self.sync_index()
+            owner = self.index.get_owner(token_id)
+        return owner
+
+    # This function raises an error if the address is not the owner of the token.
+    def check_owner(self, address: str, token_id: int, verify: bool = False) -> None:
+        if self.owner_of(token_id, verify=verify) != address:
+            raise Exception("You are not the owner of this token")
+
+    # This function returns the number of tokens owned by the address from the index.
+    # If verify is True, the balance is read from the chain.
+    def balance_of(self, address: str, verify: bool = False) -> int:
+        address = Web3.to_checksum_address(address)
+        self.connect()
+        if verify:
+            return self.contract.functions.balanceOf(address).call()
+        return self.index.get_balance(address)
+
+    # This function fetches the Transfer events after the last indexed block and merges them into the index.
+    # The blocks are scanned page by page and the checkpoint moves after each page, so an interrupted backfill resumes.
+    # on_page is called with the last block of each page once the page is merged.
+    def sync_index(self, on_page: Callable[[int], None] | None = None) -> int:
+        self.connect()
+        with self.sync_lock:
+            to_block = self.w3.eth.block_number
+            self.rollback_reorg(to_block)
+            from_block = self.index.get_last_block() + 1
+            final_block = to_block - self.confirmations
+            # Scanning a long gap block by block would cost more than reading each cached name once
+            scan_renames = len(self.token_names) > 0 and to_block - from_block < RENAME_SCAN_MAX_BLOCKS
+            if len(self.token_names) > 0 and not scan_renames:
+                self.refresh_token_names()
+            count = 0
+            for last_block, logs in self.scanner.scan(from_block, to_block):
+                # Keep the hashes of the blocks that are not final and of the checkpoint block
+                block_hashes = self.get_block_hashes(range(min(last_block, max(from_block, final_block + 1)), last_block + 1))
+                if any(log["blockHash"].to_0x_hex() != block_hashes.get(log["blockNumber"], log["blockHash"].to_0x_hex()) for log in logs):
+                    # A reorg happened during the scan, the next sync rolls it back
+                    print("Chain reorganized while syncing the index")
+                    break
+                # Drop the cached names of the tokens renamed in the page before moving the checkpoint
+                if scan_renames:
+                    self.token_names.invalidate(self.find_renamed_tokens(from_block, last_block))
+                self.index.add_transfers(logs, last_block, block_hashes, final_block, from_block)
+                count += len(logs)
+                from_block = last_block + 1
+                if on_page is not None:
+                    on_page(last_block)
+            return count
+
+    # This function compares the block hashes recorded in the index with the chain and rolls back the replaced blocks.
+    # If the reorg is deeper than the recorded blocks or the chain was reset, the whole index is rebuilt.
+    def rollback_reorg(self, latest_block: int) -> None:
+        last_block = self.index.get_last_block()
+        recorded = self.index.get_block_hashes()
+        if last_block > latest_block and len(recorded) == 0:
+            print("Chain was reset, rebuilding the index")
+            self.index.reset()
+            self.token_names.clear()
+            return
+        current = self.get_block_hashes(block_number for block_number in recorded if block_number <= latest_block)
+        replaced = [block_number for block_number, block_hash in recorded.items() if current.get(block_number) != block_hash]
+        if len(replaced) == 0:
+            return
+
+        # The names may have been changed in the replaced blocks
+        self.token_names.clear()
+        fork_block = min(replaced)
+        if fork_block == min(recorded) and fork_block > 0:
+            print(f"Chain reorganized deeper than block {fork_block}, rebuilding the index")
+            self.index.reset()
+        else:
+            print(f"Chain reorganized from block {fork_block}, rolling back the index")
+            self.index.rollback(fork_block)
+
+    # This function returns the hashes of the given blocks with batch requests.
+    def get_block_hashes(self, block_numbers: Iterable[int]) -> Dict[int, str]:
+        block_numbers = list(block_numbers)
+        block_hashes: Dict[int, str] = {}
+        for start in range(0, len(block_numbers), RPC_BATCH_SIZE):
+            chunk = block_numbers[start:start + RPC_BATCH_SIZE]
+            w3, _ = self.get_batch_client()
+            with w3.batch_requests() as batch:
+                for block_number in chunk:
+                    batch.add(w3.eth.get_block(block_number))
+                blocks = batch.execute()
+            block_hashes.update((block["number"], block["hash"].to_0x_hex()) for block in blocks)
+        return block_hashes
+
+    # This function starts a background follower that applies new Transfer events to the index as blocks arrive.
+    # New blocks come from a websocket subscription if ws_url is given, otherwise from polling a block filter.
+    def start_follower(self, ws_url: str | None = None, poll_interval: float = 1.0) -> None:
+        if self.follower is not None and self.follower.is_running():
+            return
+        self.follower = TransferFollower(self, ws_url=ws_url, poll_interval=poll_interval)
+        self.follower.start()
+
+    # This function stops the background follower.
+    def stop_follower(self) -> None:
+        if self.follower is not None:
+            self.follower.stop()
+            self.follower = None
+
+    # This function starts the worker of the durable outbox that mints the queued rewards in the background.
+    # The outbox is persisted in a SQLite file per contract and account under cache_dir, and its pending transactions are resumed.
+    def start_outbox(self) -> None:
+        if self.outbox is not None:
+            return
+        path = os.path.join(self.cache_dir, f"{self.contract.address.lower()}-{self.account.address.lower()}.outbox.sqlite3")
+        self.outbox = TransactionOutbox(self, path)
+        self.outbox.start()
+
+    # This function stops the worker of the durable outbox. The queued rewards are kept for the next run.
+    def stop_outbox(self) -> None:
+        if self.outbox is not None:
+            self.outbox.stop()
+            self.outbox = None
+
+    # This function finds the tokens renamed by setTokenName transactions to the contract in the block range.
+    # The ABI has no event for renaming, so the transactions of the blocks are fetched with batch requests.
+    # Only the direct calls are found, a rename through another contract (e.g. a multisig) is an internal call and is missed.
+    def find_renamed_tokens(self, from_block: int, to_block: int) -> List[int]:
+        selector = get_function_selectors()[self.contract.functions.setTokenName.signature]
+        token_ids = []
+        for start in range(from_block, to_block + 1, RPC_BATCH_SIZE):
+            w3, _ = self.get_batch_client()
+            with w3.batch_requests() as batch:
+                for block_number in range(start, min(start + RPC_BATCH_SIZE - 1, to_block) + 1):
+                    batch.add(w3.eth.get_block(block_number, full_transactions=True))
+                blocks = batch.execute()
+            for block in blocks:
+                for tx in block["transactions"]:
+                    if tx["to"] == self.contract.address and bytes(tx["input"][:4]) == selector:
+                        _, params = self.contract.decode_function_input(tx["input"])
+                        token_ids.append(params["tokenId"])
+        return token_ids
+
+    # This function returns the name of the token.
+    def get_token_name(self, token_id: int) -> str:
+        return self.get_token_names([token_id])[token_id]
+
+    # This function resolves the names of the given tokens from the cache and JSON-RPC batch requests for the rest.
+    def get_token_names(self, token_ids: Iterable[int]) -> Dict[int, str]:
+        self.connect()
+        names, unique_ids = self.get_cached_token_names(token_ids)
+        for start in range(0, len(unique_ids), RPC_BATCH_SIZE):
+            chunk = unique_ids[start:start + RPC_BATCH_SIZE]
+            results = self.call_token_names(chunk)
+            names.update(zip(chunk, results))
+            self.token_names.put_many(dict(zip(chunk, results)))
+        return names
+
+    # This function returns the cached names of the given tokens and the deduplicated IDs of the tokens not in the cache, in their order.
+    def get_cached_token_names(self, token_ids: Iterable[int]) -> Tuple[Dict[int, str], List[int]]:
+        unique_ids = list(dict.fromkeys(token_ids))
+        names: Dict[int, str] = self.token_names.get_many(unique_ids)
+        return names, [token_id for token_id in unique_ids if token_id not in names]
+
+    # This function reads the names of the tokens from the chain with one batch request.
+    def call_token_names(self, token_ids: List[int]) -> List[str]:
+        try:
+            w3, contract = self.get_batch_client()
+            with w3.batch_requests() as batch:
+                for token_id in token_ids:
+                    batch.add(contract.functions.getTokenName(token_id))
+                return batch.execute()
+        except Exception as e:
+            # Fall back to one call per token if the node does not support batch requests
+            print(f"Error resolving token names in batch: {e}")
+            return [self.contract.functions.getTokenName(token_id).call() for token_id in token_ids]
+
+    # This function reads all the cached token names from the chain again and drops the ones that changed.
+    # It costs one batch request per RPC_BATCH_SIZE cached tokens, whatever the number of blocks since the last sync.
+    def refresh_token_names(self) -> None:
+        cached = self.token_names.get_all()
+        token_ids = list(cached)
+        for start in range(0, len(token_ids), RPC_BATCH_SIZE):
+            chunk = token_ids[start:start + RPC_BATCH_SIZE]
+            results = self.call_token_names(chunk)
+            self.token_names.invalidate(token_id for token_id, name in zip(chunk, results) if name != cached[token_id])
+
+    # This function yields the tokens transferred from or to the address, or all the tokens if the address is None.
+    # The transfers are read from the index page by page, so memory stays bounded on long histories.
+    # If the index is synced, the tokens of each scanned page are yielded as soon as the page is merged, so a cold index streams
+    # while the rest of the chain is scanned. The sync runs in a worker thread that holds the sync lock, not in the consumer.
+    def iter_tokens(self, address: str | None = None, page_size: int = 500) -> Iterator[Token]:
+        if address is not None:
+            address = Web3.to_checksum_address(address)
+        from_block = 0
+        # The follower keeps the index up to date, so the chain is only read when it is not running
+        if self.follower is None or not self.follower.is_running():
+            merged = queue.Queue()
+
+            def sync() -> None:
+                try:
+                    self.sync_index(on_page=merged.put)
+                except Exception as e:
+                    merged.put(e)
+                    return
+                merged.put(None)
+
+            threading.Thread(target=sync, name="index-sync", daemon=True).start()
+            # The pages are merged in chain order, so each block range is read once
+            while (last_block := merged.get()) is not None:
+                if isinstance(last_block, Exception):
+                    raise last_block
+                yield from self._iter_index_tokens(address, page_size, from_block, last_block)
+                from_block = last_block + 1
+        yield from self._iter_index_tokens(address, page_size, from_block, None)
+
+    # This function yields the tokens of the indexed transfers in the block range.
+    def _iter_index_tokens(self, address: str | None, page_size: int, from_block: int, to_block: int | None) -> Iterator[Token]:
+        for page in self.index.iter_transfers(address, page_size, from_block, to_block):
+            transfers = self.filter_transfers(page)
+            names = self.get_token_names(transfer["token_id"] for transfer in transfers)
+            yield from self.build_tokens(transfers, names)
+
+    # This function drops the mints to my address from the transfers of the index. It is shared with the async client.
+    def filter_transfers(self, transfers: List[Dict]) -> List[Dict]:
+        # check if the log is mint the NFT to my address, which is transferred to the receiver afterwards
+        return [
+            transfer for transfer in transfers
+            if transfer["from_address"] != ZERO_ADDRESS or transfer["to_address"] != self.account.address
+        ]
+
+    # This function builds the tokens from the transfers and the names of their tokens.
+    def build_tokens(self, transfers: List[Dict], names: Dict[int, str]) -> List[Token]:
+        return [
+            Token(
+                from_address=transfer["from_address"],
+                to_address=transfer["to_address"],
+                token_id=transfer["token_id"],
+                token_name=names[transfer["token_id"]]
             )
-            tokens.append(token)
+            for transfer in transfers
+        ]
+
+    # This function fetches the tokens transferred from or to the address, or all the tokens if the address is None.
+    def fetch_tokens(self, address: str | None = None) -> List[Token]:
+        return list(self.iter_tokens(address))
+
+_contracts: Dict[Tuple[str, str, str], Contract] = {}
+# The keyword arguments of each shared client with the defaults filled in
+_contract_options: Dict[Tuple[str, str, str], Dict] = {}
+_contracts_lock = threading.Lock()
+
+# This function returns the Contract client shared in the process by every caller with the same RPC URL, contract address and account.
+# The client is created on the first call and connects on its first use.
+# The keyword arguments apply when it is created, and a later call with other values raises an error instead of returning a client configured differently.
+def get_contract(rpc_url: str, contract_address: str, private_key: str, **kwargs) -> Contract:
+    if private_key is None:
+        raise Exception("Private key is None")
+    key = (rpc_url, contract_address.lower(), Account.from_key(private_key).address)
+    with _contracts_lock:
+        if key not in _contracts:
+            _contracts[key] = Contract(rpc_url, contract_address, private_key, **kwargs)
+            defaults = {
+                name: parameter.default
+                for name, parameter in inspect.signature(Contract.__init__).parameters.items()
+                if parameter.default is not inspect.Parameter.empty
+            }
+            _contract_options[key] = {**defaults, **kwargs}
+            return _contracts[key]
+        mismatched = [name for name, value in kwargs.items() if _contract_options[key].get(name) != value]
+        if len(mismatched) > 0:
+            raise Exception(f"The shared contract client was created with other {', '.join(mismatched)}")
+        return _contracts[key]
 
-        return tokens
+# This function drops the shared clients, e.g. between tests. The clients in use keep working.
+def reset_contracts() -> None:
+    with _contracts_lock:
+        _contracts.clear()
+        _contract_options.clear()
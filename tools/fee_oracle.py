@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Dict, Tuple
+from web3 import Web3
+
+class FeeOracle:
+    """
+    Price transactions for fast inclusion without extra RPC calls per transaction.
+    The chain ID is read once, the gas of each contract function is estimated once per size of its calldata,
+    and the base fee and priority fee are read from the recent blocks with eth_feeHistory and cached for ttl seconds.
+    """
+
+    def __init__(
+        self,
+        w3,
+        ttl: float = 5.0,
+        history_blocks: int = 5,
+        reward_percentile: int = 75,
+        gas_margin: float = 1.2,
+        default_priority_fee: int = Web3.to_wei(1, "gwei"),
+    ):
+        self.w3 = w3
+        self.ttl = ttl
+        self.history_blocks = history_blocks
+        self.reward_percentile = reward_percentile
+        self.gas_margin = gas_margin
+        self.default_priority_fee = default_priority_fee
+        self.lock = threading.Lock()
+        self.chain_id = None
+        self.gas_estimates: Dict[Tuple[str, int], int] = {}
+        self.fees = None
+        self.fees_expire_at = 0.0
+
+    def get_chain_id(self) -> int:
+        with self.lock:
+            if self.chain_id is None:
+                self.chain_id = self.w3.eth.chain_id
+            return self.chain_id
+
+    def get_gas(self, contract_function, from_address: str) -> int:
+        """
+        Get the gas limit for the contract function with a margin over the estimate.
+        The estimate is cached per function and per 32 bytes of calldata, e.g. longer token names need more storage.
+        """
+        key = (contract_function.fn_name, len(contract_function._encode_transaction_data()) // 32)
+        with self.lock:
+            gas = self.gas_estimates.get(key)
+        if gas is None:
+            gas = int(contract_function.estimate_gas({"from": from_address}) * self.gas_margin)
+            with self.lock:
+                self.gas_estimates[key] = gas
+        return gas
+
+    def get_fees(self) -> Tuple[int, int]:
+        """
+        Get (maxFeePerGas, maxPriorityFeePerGas) from the recent blocks.
+        The max fee covers the base fee doubling before the transaction is mined.
+        """
+        with self.lock:
+            if self.fees is not None and time.monotonic() < self.fees_expire_at:
+                return self.fees
+
+        history = self.w3.eth.fee_history(self.history_blocks, "latest", [self.reward_percentile])
+        # The last base fee is the one of the next block
+        base_fee = history["baseFeePerGas"][-1]
+        rewards = sorted(reward[0] for reward in history.get("reward", []) if len(reward) > 0)
+        priority_fee = rewards[len(rewards) // 2] if len(rewards) > 0 else self.default_priority_fee
+        fees = (2 * base_fee + priority_fee, priority_fee)
+
+        with self.lock:
+            self.fees = fees
+            self.fees_expire_at = time.monotonic() + self.ttl
+        return fees
+
+    def get_transaction_params(self, contract_function, from_address: str) -> Dict[str, int]:
+        """
+        Get the chain ID, gas and fee parameters of a transaction for the contract function.
+        """
+        max_fee, priority_fee = self.get_fees()
+        return {
+            "chainId": self.get_chain_id(),
+            "gas": self.get_gas(contract_function, from_address),
+            "maxFeePerGas": max_fee,
+            "maxPriorityFeePerGas": priority_fee,
+        }
@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Tuple
+
+class LogScanner:
+    """
+    Page through a block range with eth_getLogs.
+    The window grows while the responses are small and shrinks when the node fails or a response is too large.
+    Up to max_workers windows are fetched concurrently, and the pages are yielded in block order.
+    """
+
+    def __init__(
+        self,
+        event,
+        initial_window: int = 2000,
+        min_window: int = 1,
+        max_window: int = 100000,
+        target_logs: int = 1000,
+        max_workers: int = 4,
+    ):
+        self.event = event
+        self.window = initial_window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.target_logs = target_logs
+        self.max_workers = max_workers
+
+    def _get_logs(self, from_block: int, to_block: int) -> List:
+        return self.event.get_logs(from_block=from_block, to_block=to_block)
+
+    def _resize(self, log_count: int) -> None:
+        if log_count > self.target_logs:
+            self.window = max(self.min_window, self.window // 2)
+        elif log_count < self.target_logs // 2:
+            self.window = min(self.max_window, self.window * 2)
+
+    def scan(self, from_block: int, to_block: int) -> Iterator[Tuple[int, List]]:
+        """
+        Yield (last block of the page, logs of the page) from from_block to to_block.
+        """
+        start = from_block
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while start <= to_block:
+                # Split the next blocks into windows of the current size
+                ranges = []
+                range_start = start
+                while range_start <= to_block and len(ranges) < self.max_workers:
+                    range_end = min(range_start + self.window - 1, to_block)
+                    ranges.append((range_start, range_end))
+                    range_start = range_end + 1
+                futures = [executor.submit(self._get_logs, *block_range) for block_range in ranges]
+
+                largest_page = 0
+                for (range_start, range_end), future in zip(ranges, futures):
+                    try:
+                        logs = future.result()
+                    except Exception as e:
+                        # Retry the failed range with a smaller window
+                        if self.window <= self.min_window:
+                            raise Exception(f"Failed to fetch logs for blocks {range_start}-{range_end}: {e}")
+                        self.window = max(self.min_window, self.window // 2)
+                        # Discard the remaining ranges, they are fetched again with the new window
+                        for remaining in futures:
+                            remaining.cancel()
+                        break
+                    yield range_end, logs
+                    start = range_end + 1
+                    largest_page = max(largest_page, len(logs))
+                else:
+                    self._resize(largest_page)
@@ -0,0 +1,61 @@
+import threading
+from typing import Dict, Set, Tuple
+
+class NonceManager:
+    """
+    Thread-safe nonce allocator for one account.
+    The next nonce is read from the chain once and then handed out locally,
+    so several transactions can be signed and sent without waiting on each other.
+    The nonces handed out but not broadcast yet are tracked, so that a resync does not hand them out again.
+    """
+
+    def __init__(self, w3, address: str):
+        self.w3 = w3
+        self.address = address
+        self.lock = threading.Lock()
+        self.next_nonce = None
+        self.in_flight: Set[int] = set()
+
+    def allocate(self) -> int:
+        """
+        Allocate the next nonce. The first call reads the pending transaction count from the chain.
+        """
+        with self.lock:
+            if self.next_nonce is None:
+                self.next_nonce = self.w3.eth.get_transaction_count(self.address, "pending")
+            nonce = self.next_nonce
+            self.next_nonce += 1
+            self.in_flight.add(nonce)
+            return nonce
+
+    def release(self, nonce: int) -> None:
+        """
+        Mark the nonce as broadcast, the pending transaction count of the chain includes it from now on.
+        """
+        with self.lock:
+            self.in_flight.discard(nonce)
+
+    def resync(self, nonce: int | None = None) -> None:
+        """
+        Read the next nonce from the chain again, e.g. after a send error or a dropped transaction.
+        nonce is the nonce of the failed transaction, if any. The nonces handed out to the other transactions
+        and not broadcast yet are not counted by the chain, so the next nonce stays above them.
+        """
+        with self.lock:
+            if nonce is not None:
+                self.in_flight.discard(nonce)
+            pending = self.w3.eth.get_transaction_count(self.address, "pending")
+            self.next_nonce = max([pending] + [in_flight + 1 for in_flight in self.in_flight])
+
+_managers: Dict[Tuple[str, str], NonceManager] = {}
+_managers_lock = threading.Lock()
+
+def get_nonce_manager(w3, address: str) -> NonceManager:
+    """
+    Get the nonce manager shared by every client of the account on the same RPC endpoint.
+    """
+    key = (str(w3.provider.endpoint_uri), address)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = NonceManager(w3, address)
+        return _managers[key]
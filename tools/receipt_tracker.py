@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Tuple
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+
+class ReceiptTracker:
+    """
+    Resolve the receipts of many pending transactions from one background thread.
+    The thread polls the block number, fetches each new block once, and requests the receipts
+    of only the pending transactions included in it, so the cost does not grow with the number of pending transactions.
+    The thread starts when a transaction is tracked and stops when nothing is pending.
+    """
+
+    def __init__(self, w3, poll_interval: float = 0.5, timeout: float = 120.0, batch_size: int = 100):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending: Dict[HexBytes, Tuple[Future, float]] = {}
+        self.unchecked: List[HexBytes] = []
+        self.last_block = None
+        self.thread = None
+
+    def track(self, tx_hash) -> Future:
+        """
+        Get a future that resolves to the receipt of the transaction, or fails with TimeExhausted after timeout seconds.
+        """
+        tx_hash = HexBytes(tx_hash)
+        with self.lock:
+            if tx_hash in self.pending:
+                return self.pending[tx_hash][0]
+            future = Future()
+            self.pending[tx_hash] = (future, time.monotonic() + self.timeout)
+            # The transaction may have been mined before it was tracked, so check it once directly
+            self.unchecked.append(tx_hash)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return future
+
+    def track_async(self, tx_hash) -> asyncio.Future:
+        """
+        Get an awaitable that resolves to the receipt of the transaction in the running event loop.
+        """
+        return asyncio.wrap_future(self.track(tx_hash))
+
+    def replace(self, tx_hash, new_tx_hash) -> None:
+        """
+        Follow a replacement of the transaction that has the same nonce.
+        The future of the transaction resolves to the receipt of whichever version is mined.
+        """
+        tx_hash = HexBytes(tx_hash)
+        new_tx_hash = HexBytes(new_tx_hash)
+        with self.lock:
+            entry = self.pending.get(tx_hash)
+            if entry is None:
+                return
+            self.pending[new_tx_hash] = entry
+            self.unchecked.append(new_tx_hash)
+        self.wakeup.set()
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return len({id(future) for future, _ in self.pending.values()})
+
+    def _run(self) -> None:
+        while True:
+            self.wakeup.clear()
+            with self.lock:
+                if len(self.pending) == 0:
+                    # Start from the latest block again when the next transaction is tracked
+                    self.thread = None
+                    self.last_block = None
+                    return
+                unchecked, self.unchecked = self.unchecked, []
+            try:
+                self._poll(unchecked)
+            except Exception as e:
+                # Check the new transactions again in the next round
+                print(f"Error tracking receipts: {e}")
+                with self.lock:
+                    self.unchecked = unchecked + self.unchecked
+            self._expire()
+            self.wakeup.wait(self.poll_interval)
+
+    def _poll(self, unchecked: List[HexBytes]) -> None:
+        latest = self.w3.eth.block_number
+        if self.last_block is not None and latest < self.last_block:
+            # The chain was reorganized, so check every pending transaction directly
+            with self.lock:
+                unchecked = list(self.pending)
+        elif self.last_block is not None and latest > self.last_block:
+            with self.lock:
+                pending_count = len(self.pending)
+            if latest - self.last_block > pending_count:
+                # Checking the receipts directly is cheaper than fetching all the missed blocks
+                with self.lock:
+                    unchecked = list(self.pending)
+            else:
+                self._resolve(self._find_in_blocks(range(self.last_block + 1, latest + 1)))
+        self.last_block = latest
+        self._resolve(self._find_mined(set(unchecked)))
+
+    def _find_in_blocks(self, block_numbers: Iterable[int]) -> List[HexBytes]:
+        # Get the pending transactions included in the blocks
+        block_numbers = list(block_numbers)
+        mined = []
+        for start in range(0, len(block_numbers), self.batch_size):
+            with self.w3.batch_requests() as batch:
+                for block_number in block_numbers[start:start + self.batch_size]:
+                    batch.add(self.w3.eth.get_block(block_number))
+                blocks = batch.execute()
+            with self.lock:
+                mined += [tx_hash for block in blocks for tx_hash in block["transactions"] if tx_hash in self.pending]
+        return mined
+
+    def _find_mined(self, tx_hashes: Iterable[HexBytes]) -> List[HexBytes]:
+        # Get the transactions that have a receipt
+        # The raw batch is used because a formatted batch fails if any of the receipts is missing
+        tx_hashes = list(tx_hashes)
+        mined = []
+        for start in range(0, len(tx_hashes), self.batch_size):
+            chunk = tx_hashes[start:start + self.batch_size]
+            responses = self.w3.provider.make_batch_request(
+                [("eth_getTransactionReceipt", [tx_hash.to_0x_hex()]) for tx_hash in chunk]
+            )
+            if isinstance(responses, dict):
+                raise Exception(f"Failed to get transaction receipts: {responses.get('error')}")
+            mined += [tx_hash for tx_hash, response in zip(chunk, responses) if response.get("result") is not None]
+        return mined
+
+    def _resolve(self, tx_hashes: List[HexBytes]) -> None:
+        # Get the receipts of the mined transactions and resolve their futures
+        for start in range(0, len(tx_hashes), self.batch_size):
+            chunk = tx_hashes[start:start + self.batch_size]
+            with self.w3.batch_requests() as batch:
+                for tx_hash in chunk:
+                    batch.add(self.w3.eth.get_transaction_receipt(tx_hash))
+                receipts = batch.execute()
+            for tx_hash, receipt in zip(chunk, receipts):
+                with self.lock:
+                    entry = self.pending.pop(tx_hash, None)
+                    if entry is None:
+                        continue
+                    # Stop following the other versions of the transaction
+                    for other_hash in [other_hash for other_hash, other in self.pending.items() if other[0] is entry[0]]:
+                        del self.pending[other_hash]
+                entry[0].set_result(receipt)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self.lock:
+            expired = [tx_hash for tx_hash, (_, deadline) in self.pending.items() if deadline < now]
+            entries = [self.pending.pop(tx_hash) for tx_hash in expired]
+        for tx_hash, (future, _) in zip(expired, entries):
+            # The versions of a replaced transaction share the future
+            if future.done():
+                continue
+            future.set_exception(
+                TimeExhausted(f"Transaction {tx_hash.to_0x_hex()} is not in the chain after {self.timeout} seconds")
+            )
@@ -0,0 +1,82 @@
+import threading
+from typing import Dict, Tuple
+import requests
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+from web3 import AsyncHTTPProvider, AsyncWeb3, HTTPProvider, Web3
+from web3._utils.http_session_manager import HTTPSessionManager
+
+class TransportConfig(BaseModel):
+    """
+    Configuration of the RPC transport.
+    """
+    connect_timeout: float = 3.05
+    read_timeout: float = 30.0
+    pool_size: int = 32
+    keepalive_timeout: float = 60.0
+
+_sessions: Dict[Tuple[str, int], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+def get_session(rpc_url: str, config: TransportConfig = TransportConfig()) -> requests.Session:
+    """
+    Get the keep-alive HTTP session shared by every client of the RPC endpoint in the process.
+    Up to pool_size connections are kept open and reused by all threads.
+    """
+    key = (rpc_url, config.pool_size)
+    with _sessions_lock:
+        if key not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.pool_size, pool_block=False)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return _sessions[key]
+
+class SharedSessionManager(HTTPSessionManager):
+    """
+    Session manager that returns one shared session for every thread.
+    The default manager of web3 creates a session per thread, so the short-lived worker threads
+    of the log scanner and the background threads each opened their own connections.
+    """
+
+    def __init__(self, session: requests.Session):
+        super().__init__()
+        self.session = session
+
+    def cache_and_return_session(self, endpoint_uri, session: requests.Session = None, request_timeout=None) -> requests.Session:
+        return self.session
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    HTTP provider that sends the requests of all threads through the pooled session of the endpoint, with timeouts.
+    """
+
+    def __init__(self, rpc_url: str, config: TransportConfig = TransportConfig(), **kwargs):
+        super().__init__(rpc_url, request_kwargs={"timeout": (config.connect_timeout, config.read_timeout)}, **kwargs)
+        self._request_session_manager = SharedSessionManager(get_session(rpc_url, config))
+
+def get_web3(rpc_url: str, config: TransportConfig = TransportConfig(), **kwargs) -> Web3:
+    """
+    Create a Web3 instance on the pooled transport. The keyword arguments are passed to the provider.
+    """
+    return Web3(PooledHTTPProvider(rpc_url, config, **kwargs))
+
+async def get_async_web3(rpc_url: str, config: TransportConfig = TransportConfig(), **kwargs) -> AsyncWeb3:
+    """
+    Create an AsyncWeb3 instance for the running event loop with a keep-alive connection pool.
+    The default session of web3 closes the connection after each request.
+    The session is closed by await w3.provider.disconnect().
+    """
+    # web3 passes a timeout to every request, which replaces the timeout of the session, so it is set on the provider
+    timeout = ClientTimeout(sock_connect=config.connect_timeout, sock_read=config.read_timeout)
+    request_kwargs = {"timeout": timeout, **kwargs.pop("request_kwargs", {})}
+    provider = AsyncHTTPProvider(rpc_url, request_kwargs=request_kwargs, **kwargs)
+    session = ClientSession(
+        raise_for_status=True,
+        connector=TCPConnector(limit=config.pool_size, keepalive_timeout=config.keepalive_timeout),
+        timeout=timeout,
+    )
+    await provider.cache_async_session(session)
+    return AsyncWeb3(provider)
@@ -0,0 +1,262 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+class TokenIndex:
+    """
+    Local index of the Transfer events of a contract.
+    The index records the last indexed block so that each run only fetches the new blocks,
+    and the hashes of the recent blocks so that a reorg only rolls back the affected range.
+    The current owner of each token and the balance of each address are derived from the transfers.
+    """
+
+    def __init__(self, path: str, contract_address: str):
+        if path != ":memory:" and os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.contract_address = contract_address.lower()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS transfers (
+                block_number INTEGER NOT NULL,
+                log_index INTEGER NOT NULL,
+                transaction_hash TEXT NOT NULL,
+                from_address TEXT NOT NULL,
+                to_address TEXT NOT NULL,
+                token_id TEXT NOT NULL,
+                PRIMARY KEY (block_number, log_index)
+            );
+            CREATE TABLE IF NOT EXISTS blocks (
+                block_number INTEGER PRIMARY KEY,
+                block_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS owners (
+                token_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS balances (
+                address TEXT PRIMARY KEY,
+                balance INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS transfers_from_address ON transfers (from_address);
+            CREATE INDEX IF NOT EXISTS transfers_to_address ON transfers (to_address);
+            CREATE INDEX IF NOT EXISTS transfers_token_id ON transfers (token_id, block_number, log_index);
+            """
+        )
+
+        # Reset the index if it was built for another contract
+        with self.conn:
+            if self._get_meta("contract_address") not in (None, self.contract_address):
+                self._clear()
+            self._set_meta("contract_address", self.contract_address)
+            # Derive the owners of an index created before the owners table existed
+            if self._get_meta("owners") is None:
+                self._refresh_owners(row[0] for row in self.conn.execute("SELECT DISTINCT token_id FROM transfers").fetchall())
+                self._set_meta("owners", "1")
+
+    def _get_meta(self, key: str) -> str | None:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _last_block(self) -> int:
+        value = self._get_meta("last_block")
+        return -1 if value is None else int(value)
+
+    def get_last_block(self) -> int:
+        """
+        Get the last block number included in the index. -1 means nothing is indexed yet.
+        """
+        with self.lock:
+            return self._last_block()
+
+    def _refresh_owners(self, token_ids: Iterable[str]) -> None:
+        # Set the owner of each token to the receiver of its latest transfer and update the balances
+        for token_id in set(token_ids):
+            row = self.conn.execute("SELECT owner FROM owners WHERE token_id = ?", (token_id,)).fetchone()
+            old_owner = None if row is None else row[0]
+            row = self.conn.execute(
+                "SELECT to_address FROM transfers WHERE token_id = ? ORDER BY block_number DESC, log_index DESC LIMIT 1",
+                (token_id,),
+            ).fetchone()
+            new_owner = None if row is None or row[0] == ZERO_ADDRESS else row[0]
+            if old_owner == new_owner:
+                continue
+            if old_owner is not None:
+                self.conn.execute("UPDATE balances SET balance = balance - 1 WHERE address = ?", (old_owner,))
+                self.conn.execute("DELETE FROM owners WHERE token_id = ?", (token_id,))
+            if new_owner is not None:
+                self.conn.execute(
+                    "INSERT INTO balances (address, balance) VALUES (?, 1) ON CONFLICT (address) DO UPDATE SET balance = balance + 1",
+                    (new_owner,),
+                )
+                self.conn.execute("INSERT INTO owners (token_id, owner) VALUES (?, ?)", (token_id, new_owner))
+        self.conn.execute("DELETE FROM balances WHERE balance <= 0")
+
+    def add_transfers(
+        self,
+        logs: List,
+        last_block: int,
+        block_hashes: Dict[int, str] | None = None,
+        final_block: int = -1,
+        from_block: int | None = None,
+    ) -> None:
+        """
+        Merge decoded Transfer logs into the index and move the checkpoint to last_block.
+        If from_block is given, the logs replace the indexed transfers from from_block to last_block,
+        e.g. the transfers applied from the receipts of our own transactions.
+        The hashes of the blocks after final_block are kept to detect reorgs, the older ones are final.
+        The logs, the block hashes, the owners and the checkpoint are written in one transaction.
+        """
+        rows = [
+            (
+                log["blockNumber"],
+                log["logIndex"],
+                log["transactionHash"].to_0x_hex(),
+                log["args"]["from"],
+                log["args"]["to"],
+                str(log["args"]["tokenId"]),
+            )
+            for log in logs
+        ]
+        with self.lock, self.conn:
+            token_ids = [row[5] for row in rows]
+            if from_block is not None:
+                token_ids += [
+                    row[0]
+                    for row in self.conn.execute(
+                        "SELECT token_id FROM transfers WHERE block_number BETWEEN ? AND ?",
+                        (from_block, last_block),
+                    ).fetchall()
+                ]
+                self.conn.execute("DELETE FROM transfers WHERE block_number BETWEEN ? AND ?", (from_block, last_block))
+            # Replace the transfers at the same positions, e.g. ones applied from a receipt before a reorg
+            for row in rows:
+                replaced = self.conn.execute(
+                    "SELECT token_id FROM transfers WHERE block_number = ? AND log_index = ?",
+                    (row[0], row[1]),
+                ).fetchone()
+                if replaced is not None:
+                    token_ids.append(replaced[0])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO transfers VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._refresh_owners(token_ids)
+            if block_hashes:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO blocks (block_number, block_hash) VALUES (?, ?)",
+                    list(block_hashes.items()),
+                )
+            if last_block > self._last_block():
+                self._set_meta("last_block", str(last_block))
+            # Keep the hash of the checkpoint block even if it is final
+            self.conn.execute(
+                "DELETE FROM blocks WHERE block_number <= ? AND block_number < ?",
+                (final_block, self._last_block()),
+            )
+
+    def get_block_hashes(self) -> Dict[int, str]:
+        """
+        Get the hashes of the blocks that are not final yet.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT block_number, block_hash FROM blocks").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def rollback(self, block_number: int) -> None:
+        """
+        Remove the transfers and block hashes from block_number and move the checkpoint back before it.
+        """
+        with self.lock, self.conn:
+            token_ids = [
+                row[0]
+                for row in self.conn.execute("SELECT token_id FROM transfers WHERE block_number >= ?", (block_number,)).fetchall()
+            ]
+            self.conn.execute("DELETE FROM transfers WHERE block_number >= ?", (block_number,))
+            self._refresh_owners(token_ids)
+            self.conn.execute("DELETE FROM blocks WHERE block_number >= ?", (block_number,))
+            if self._last_block() >= block_number:
+                self._set_meta("last_block", str(block_number - 1))
+
+    def iter_transfers(
+        self, address: str | None = None, page_size: int = 500, from_block: int = 0, to_block: int | None = None
+    ) -> Iterator[List[Dict]]:
+        """
+        Iterate over the indexed transfers from from_block (to to_block if given) in chain order, one page of at most page_size transfers at a time.
+        If address is given, only the transfers from or to the checksum address are returned.
+        """
+        query = "SELECT block_number, log_index, transaction_hash, from_address, to_address, token_id FROM transfers"
+        query += " WHERE (block_number, log_index) > (?, ?)"
+        if to_block is not None:
+            query += " AND block_number <= ?"
+        if address is not None:
+            query += " AND (from_address = ? OR to_address = ?)"
+        query += " ORDER BY block_number, log_index LIMIT ?"
+        cursor = (from_block, -1)
+        while True:
+            params = cursor + ((to_block,) if to_block is not None else ()) + ((address, address) if address is not None else ()) + (page_size,)
+            with self.lock:
+                rows = self.conn.execute(query, params).fetchall()
+            if len(rows) == 0:
+                return
+            yield [
+                {
+                    "block_number": row[0],
+                    "log_index": row[1],
+                    "transaction_hash": row[2],
+                    "from_address": row[3],
+                    "to_address": row[4],
+                    "token_id": int(row[5]),
+                }
+                for row in rows
+            ]
+            cursor = (rows[-1][0], rows[-1][1])
+
+    def get_transfers(self, address: str | None = None) -> List[Dict]:
+        """
+        Get the indexed transfers in chain order.
+        If address is given, only the transfers from or to the checksum address are returned.
+        """
+        return [transfer for page in self.iter_transfers(address) for transfer in page]
+
+    def get_owner(self, token_id: int) -> str | None:
+        """
+        Get the current owner of the token, or None if the token is not indexed or burned.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT owner FROM owners WHERE token_id = ?", (str(token_id),)).fetchone()
+        return None if row is None else row[0]
+
+    def get_balance(self, address: str) -> int:
+        """
+        Get the number of tokens owned by the checksum address.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT balance FROM balances WHERE address = ?", (address,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def _clear(self) -> None:
+        self.conn.execute("DELETE FROM transfers")
+        self.conn.execute("DELETE FROM blocks")
+        self.conn.execute("DELETE FROM owners")
+        self.conn.execute("DELETE FROM balances")
+        self.conn.execute("DELETE FROM meta WHERE key = 'last_block'")
+
+    def reset(self) -> None:
+        """
+        Remove all indexed transfers and the checkpoint.
+        """
+        with self.lock, self.conn:
+            self._clear()
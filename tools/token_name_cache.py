@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+class TokenNameCache:
+    """
+    Bounded LRU cache of token names persisted in SQLite.
+    Entries are kept until the token is renamed on chain or evicted as least recently used.
+    The renames are found from the setTokenName transactions sent directly to the contract,
+    so a rename made through another contract (e.g. a multisig) is not seen and its old name stays cached
+    until the cached names are read again, e.g. after a long gap between syncs.
+    The file is shared by every client of the contract, so each invalidation bumps a generation in the meta table,
+    and the entries in memory are loaded again when another client (or process) invalidated names since they were loaded.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000):
+        if path != ":memory:" and os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS token_names (
+                    token_id TEXT PRIMARY KEY,
+                    token_name TEXT NOT NULL,
+                    used_at INTEGER NOT NULL
+                )
+                """
+            )
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+        self._load()
+
+    def _load(self) -> None:
+        # Load the most recently used entries, e.g. from the previous runs or after another client invalidated names
+        self.generation = self._get_generation()
+        rows = self.conn.execute(
+            "SELECT token_id, token_name, used_at FROM token_names ORDER BY used_at DESC LIMIT ?",
+            (self.max_size,),
+        ).fetchall()
+        self.entries: OrderedDict[int, str] = OrderedDict((int(row[0]), row[1]) for row in reversed(rows))
+        self.clock = rows[0][2] if rows else 0
+
+    def _get_generation(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'token_names_generation'").fetchone()
+        return int(row[0]) if row is not None else 0
+
+    def _bump_generation(self) -> None:
+        # Called in the transaction that removes the entries, so the other clients load them again
+        self.conn.execute(
+            """
+            INSERT INTO meta (key, value) VALUES ('token_names_generation', '1')
+            ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+            """
+        )
+        generation = self._get_generation()
+        if generation != self.generation + 1:
+            # Another client invalidated names too, so the entries in memory are loaded again
+            self._load()
+        self.generation = generation
+
+    def _refresh(self) -> None:
+        # The names in memory are stale if another client invalidated names since they were loaded
+        if self._get_generation() != self.generation:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_many(self, token_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Get the cached names of the given tokens and mark them as recently used.
+        """
+        hits: Dict[int, str] = {}
+        with self.lock, self.conn:
+            self._refresh()
+            for token_id in token_ids:
+                if token_id in self.entries and token_id not in hits:
+                    self.entries.move_to_end(token_id)
+                    hits[token_id] = self.entries[token_id]
+            self.clock += 1
+            self.conn.executemany(
+                "UPDATE token_names SET used_at = ? WHERE token_id = ?",
+                [(self.clock, str(token_id)) for token_id in hits],
+            )
+        return hits
+
+    def get_all(self) -> Dict[int, str]:
+        """
+        Get all the cached names without marking them as used.
+        """
+        with self.lock:
+            self._refresh()
+            return dict(self.entries)
+
+    def put_many(self, names: Dict[int, str]) -> None:
+        """
+        Store the names and evict the least recently used entries over max_size.
+        """
+        with self.lock, self.conn:
+            self.clock += 1
+            for token_id, token_name in names.items():
+                self.entries[token_id] = token_name
+                self.entries.move_to_end(token_id)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO token_names (token_id, token_name, used_at) VALUES (?, ?, ?)",
+                [(str(token_id), token_name, self.clock) for token_id, token_name in names.items()],
+            )
+            evicted = []
+            while len(self.entries) > self.max_size:
+                evicted.append(self.entries.popitem(last=False)[0])
+            self.conn.executemany("DELETE FROM token_names WHERE token_id = ?", [(str(token_id),) for token_id in evicted])
+
+    def invalidate(self, token_ids: Iterable[int]) -> None:
+        """
+        Remove the entries of the tokens whose names were changed.
+        """
+        with self.lock, self.conn:
+            for token_id in token_ids:
+                self.entries.pop(token_id, None)
+                self.conn.execute("DELETE FROM token_names WHERE token_id = ?", (str(token_id),))
+            self._bump_generation()
+
+    def clear(self) -> None:
+        """
+        Remove all entries.
+        """
+        with self.lock, self.conn:
+            self.entries.clear()
+            self.conn.execute("DELETE FROM token_names")
+            self._bump_generation()
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Tuple
+
+class CacheEntry(NamedTuple):
+    value: Any
+    block_number: int | None
+    expires_at: float
+    epoch: int
+
+class ToolResultCache:
+    """
+    TTL cache of the results of the read-only tools, keyed by the tool name and the arguments.
+    An entry is returned without any RPC call until its TTL expires. After that, it is kept for another TTL
+    if the chain has no new block since the entry was computed, which costs one eth_blockNumber instead of the tool.
+    All the entries are dropped by invalidate(), i.e. when we send a transaction or a new block arrives.
+    The cached values are shared by the callers and must not be modified.
+    """
+
+    def __init__(self, ttl: float = 5.0, max_size: int = 256):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[Tuple[str, str], CacheEntry] = OrderedDict()
+        # Bumped by invalidate(), so that a result computed before the invalidation is not stored
+        self.epoch = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def invalidate(self) -> None:
+        """
+        Drop all the entries.
+        """
+        with self.lock:
+            self.epoch += 1
+            self.entries.clear()
+
+    def get(self, name: str, args: Dict, compute: Callable[[], Any], block_number: Callable[[], int] | None = None) -> Any:
+        """
+        Get the result of the tool from the cache, or compute and store it.
+        block_number returns the latest block number to check whether an expired entry is still valid.
+        """
+        key = self._key(name, args)
+        entry = self._lookup(key)
+        current = None
+        if entry is not None:
+            if time.monotonic() < entry.expires_at:
+                return entry.value
+            if block_number is not None and entry.block_number is not None:
+                current = block_number()
+                if current == entry.block_number:
+                    self._store(key, entry.value, current, entry.epoch)
+                    return entry.value
+
+        epoch = self.epoch
+        if block_number is not None and current is None:
+            current = block_number()
+        value = compute()
+        self._store(key, value, current, epoch)
+        return value
+
+    async def aget(
+        self,
+        name: str,
+        args: Dict,
+        compute: Callable[[], Awaitable[Any]],
+        block_number: Callable[[], Awaitable[int]] | None = None,
+    ) -> Any:
+        """
+        Same as get, with the coroutine functions of the tool and the block number.
+        """
+        key = self._key(name, args)
+        entry = self._lookup(key)
+        current = None
+        if entry is not None:
+            if time.monotonic() < entry.expires_at:
+                return entry.value
+            if block_number is not None and entry.block_number is not None:
+                current = await block_number()
+                if current == entry.block_number:
+                    self._store(key, entry.value, current, entry.epoch)
+                    return entry.value
+
+        epoch = self.epoch
+        if block_number is not None and current is None:
+            current = await block_number()
+        value = await compute()
+        self._store(key, value, current, epoch)
+        return value
+
+    def _key(self, name: str, args: Dict) -> Tuple[str, str]:
+        return (name, json.dumps(args, sort_keys=True, default=str))
+
+    def _lookup(self, key: Tuple[str, str]) -> CacheEntry | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.epoch != self.epoch:
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def _store(self, key: Tuple[str, str], value: Any, block_number: int | None, epoch: int) -> None:
+        with self.lock:
+            # The cache was invalidated while the value was computed
+            if epoch != self.epoch:
+                return
+            self.entries[key] = CacheEntry(value, block_number, time.monotonic() + self.ttl, epoch)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
@@ -1,28 +1,58 @@
 from typing import Annotated, List
 from langchain_core.tools import tool
-from tools.contract import Contract, Token
+from tools.contract import get_contract, MintResult, MintStatus, Reward, Token
+from tools.async_contract import AsyncContract
 
-def get_tools(rpc_url: str, contract_address: str, private_key: str) -> List[tool]:
+def get_tools(
+    rpc_url: str,
+    contract_address: str,
+    private_key: str,
+    follow: bool = False,
+    ws_url: str | None = None,
+    direct_mint: bool = True,
+    outbox: bool = False,
+) -> List[tool]:
     
-    # Set Smart Contract Instance
-    contract = Contract(
+    # Get the Smart Contract client shared with the other tools of the same account
+    contract = get_contract(
         rpc_url=rpc_url,
         contract_address=contract_address,
         private_key=private_key,
     )
 
+    # Async client for ainvoke, which awaits the RPC requests and the receipts on the event loop
+    async_contract = AsyncContract(contract)
+
+    # Keep the transfer history warm in the background for long-running agents
+    if follow:
+        contract.start_follower(ws_url=ws_url)
+
+    # Mint in the background from a durable outbox so that the agent does not wait for the blocks
+    if outbox:
+        contract.start_outbox()
+
     @tool
     def put_token(
         to_address: Annotated[str, "The address to mint the token to"],
         token_name: Annotated[str, "The name of the token to mint"],
-    ) -> int:
+    ) -> int | str:
         """
         This tool is called smart contract for minting the NFT.
         Mint a NFT to the specified address.
         
         Returns:
             int: The token ID of the minted NFT.
+            str: The tracking ID of the queued NFT if the outbox is used.
         """
+        # Queue the reward and return its tracking ID without waiting for the transaction
+        if outbox:
+            return contract.outbox.enqueue(to_address, token_name)
+
+        # Mint to the address in one transaction
+        if direct_mint:
+            return contract.mint(to_address, token_name)
+
+        # Mint to my address and transfer it to the address in two transactions
         from_address = contract.get_address()
         token_id = contract.mint(from_address, token_name)
         if token_id == -1:
@@ -31,6 +61,50 @@ def get_tools(rpc_url: str, contract_address: str, private_key: str) -> List[too
             contract.transfer(from_address, to_address, token_id)
             return token_id
 
+    # Coroutine of put_token for ainvoke and astream, which does not block the event loop while waiting for the blocks
+    async def aput_token(to_address: str, token_name: str) -> int | str:
+        if outbox:
+            return contract.outbox.enqueue(to_address, token_name)
+        if direct_mint:
+            return await async_contract.mint(to_address, token_name)
+        from_address = async_contract.get_address()
+        token_id = await async_contract.mint(from_address, token_name)
+        if token_id == -1:
+            return -1
+        else:
+            await async_contract.transfer(from_address, to_address, token_id)
+            return token_id
+
+    put_token.coroutine = aput_token
+
+    @tool
+    def put_tokens(
+        rewards: Annotated[List[Reward], "The addresses and names of the tokens to mint"],
+    ) -> List[MintResult]:
+        """
+        This tool is called smart contract for minting many NFTs at once.
+        Mint a NFT to each specified address.
+
+        Returns:
+            List[MintResult]:
+            MintResult: {
+                "to_address": str,
+                "token_name": str,
+                "token_id": int,
+                "error": str | None,
+            }
+        1. to_address: The address the token was minted to.
+        2. token_name: The name of the token.
+        3. token_id: The ID of the minted token, or -1 if the token could not be minted.
+        4. error: The reason why the token could not be minted.
+        """
+        return contract.mint_batch(rewards)
+
+    async def aput_tokens(rewards: List[Reward]) -> List[MintResult]:
+        return await async_contract.mint_batch(rewards)
+
+    put_tokens.coroutine = aput_tokens
+
     @tool
     def fetch_tokens(
         address: Annotated[str | None, "The address to fetch tokens from"],
@@ -38,6 +112,7 @@ def get_tools(rpc_url: str, contract_address: str, private_key: str) -> List[too
         """
         This tool is called smart contract.
         Fetch all NFTs transaction history for the address.
+        If the address is None, the history of all addresses is fetched.
 
         Returns:
             List[Token]:
@@ -52,9 +127,25 @@ def get_tools(rpc_url: str, contract_address: str, private_key: str) -> List[too
         3. token_id: The ID of the token.
         4. token_name: The name of the token.
         """
-        tokens = contract.fetch_tokens()
+        # Repeated calls in the same block are served from the cache without reading the chain
+        tokens = contract.tool_cache.get(
+            "fetch_tokens",
+            {"address": address},
+            lambda: contract.fetch_tokens(address),
+            contract.get_block_number,
+        )
         return tokens
 
+    async def afetch_tokens(address: str | None) -> List[Token]:
+        return await contract.tool_cache.aget(
+            "fetch_tokens",
+            {"address": address},
+            lambda: async_contract.fetch_tokens(address),
+            async_contract.get_block_number,
+        )
+
+    fetch_tokens.coroutine = afetch_tokens
+
     @tool
     def reporting(
         token_list: Annotated[str, "The document for list of currently NFTs"],
@@ -73,11 +164,52 @@ def get_tools(rpc_url: str, contract_address: str, private_key: str) -> List[too
         report += f"送信先アドレス:\n {owner}\n"
         return report
 
+    async def areporting(token_list: str, token: str, reason: str, owner: str) -> str:
+        return reporting.func(token_list, token, reason, owner)
+
+    reporting.coroutine = areporting
+
     @tool
     def get_address() -> str:
         """
         Get my wallet address.
         """
-        return contract.get_address()
+        return contract.tool_cache.get("get_address", {}, contract.get_address)
+
+    # The tools without I/O run the same body on the event loop instead of in a thread
+    async def aget_address() -> str:
+        return get_address.func()
+
+    get_address.coroutine = aget_address
+
+    @tool
+    def get_mint_status(
+        tracking_id: Annotated[str, "The tracking ID returned by put_token"],
+    ) -> MintStatus | None:
+        """
+        Get the status of the NFT queued by put_token.
+
+        Returns:
+            MintStatus | None:
+            MintStatus: {
+                "tracking_id": str,
+                "to_address": str,
+                "token_name": str,
+                "status": "queued" | "sent" | "confirmed" | "failed",
+                "attempts": int,
+                "tx_hash": str | None,
+                "token_id": int,
+                "error": str | None,
+            }
+        None is returned if the tracking ID is unknown or the outbox is not used.
+        """
+        if contract.outbox is None:
+            return None
+        return contract.outbox.get_status(tracking_id)
+
+    async def aget_mint_status(tracking_id: str) -> MintStatus | None:
+        return get_mint_status.func(tracking_id)
+
+    get_mint_status.coroutine = aget_mint_status
 
-    return [put_token, fetch_tokens, reporting, get_address]
+    return [put_token, fetch_tokens, reporting, get_address, put_tokens, get_mint_status]
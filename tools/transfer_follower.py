@@ -0,0 +1,121 @@
+import asyncio
+import threading
+from web3 import AsyncWeb3, WebSocketProvider
+
+class TransferFollower:
+    """
+    Background thread that keeps the Transfer index of a contract warm.
+    New blocks are received from a websocket newHeads subscription if ws_url is given,
+    otherwise from polling a block filter with eth_getFilterChanges.
+    The new Transfer events are applied to the index and their token names are resolved in advance,
+    so that the reads from the agent do not need any RPC call.
+    """
+
+    def __init__(self, contract, ws_url: str | None = None, poll_interval: float = 1.0):
+        self.contract = contract
+        self.ws_url = ws_url
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="transfer-follower", daemon=True)
+        self.loop = None
+        self.task = None
+
+    def start(self) -> None:
+        """
+        Catch up with the chain and start following new blocks.
+        """
+        self.thread.start()
+        self.ready.wait()
+
+    def stop(self) -> None:
+        """
+        Stop following new blocks and wait for the thread to finish.
+        """
+        self.stop_event.set()
+        loop = self.loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self.task.cancel)
+            except RuntimeError:
+                # The subscription already ended and the loop is closed
+                pass
+        self.thread.join()
+
+    def is_running(self) -> bool:
+        return self.thread.is_alive() and not self.stop_event.is_set()
+
+    def on_new_block(self) -> None:
+        """
+        Apply the Transfer events of the new blocks to the index and resolve the names of their tokens.
+        """
+        from_block = self.contract.index.get_last_block() + 1
+        try:
+            synced = self.contract.sync_index()
+        finally:
+            # The results of the read-only tools may have changed in the new blocks.
+            # The cache is dropped after the sync, so a result computed from the index during the sync is not kept.
+            self.contract.tool_cache.invalidate()
+        if synced == 0:
+            return
+        for page in self.contract.index.iter_transfers(from_block=from_block):
+            self.contract.get_token_names(transfer["token_id"] for transfer in page)
+
+    def _run(self) -> None:
+        try:
+            self.on_new_block()
+        except Exception as e:
+            print(f"Error catching up with the chain: {e}")
+        finally:
+            self.ready.set()
+
+        if self.ws_url is not None and not self.stop_event.is_set():
+            loop = asyncio.new_event_loop()
+            try:
+                # Publish the loop only once the task exists, so that stop() can always cancel it
+                self.task = loop.create_task(self._follow_subscription())
+                self.loop = loop
+                # stop() may have run before the loop was published
+                if self.stop_event.is_set():
+                    self.task.cancel()
+                loop.run_until_complete(self.task)
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                # Fall back to polling if the websocket subscription is not available
+                print(f"Error subscribing to new blocks, falling back to polling: {e}")
+            finally:
+                self.loop = None
+                loop.close()
+        self._follow_filter()
+
+    async def _follow_subscription(self) -> None:
+        async with AsyncWeb3(WebSocketProvider(self.ws_url, max_connection_retries=1)) as w3:
+            await w3.eth.subscribe("newHeads")
+            async for _ in w3.socket.process_subscriptions():
+                await asyncio.to_thread(self._apply_new_block)
+
+    def _create_block_filter(self):
+        try:
+            return self.contract.w3.eth.filter("latest")
+        except Exception as e:
+            # Poll the block number through sync_index if the node does not support filters
+            print(f"Error creating block filter: {e}")
+            return None
+
+    def _follow_filter(self) -> None:
+        block_filter = self._create_block_filter()
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                if block_filter is None or len(block_filter.get_new_entries()) > 0:
+                    self.on_new_block()
+            except Exception as e:
+                # The node may have dropped the filter, so create it again
+                print(f"Error following new blocks: {e}")
+                block_filter = self._create_block_filter()
+
+    def _apply_new_block(self) -> None:
+        try:
+            self.on_new_block()
+        except Exception as e:
+            print(f"Error following new blocks: {e}")
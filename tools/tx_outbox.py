@@ -0,0 +1,333 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Dict, List
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TimeExhausted, TransactionNotFound, Web3RPCError
+from components.model import MintStatus
+
+class TransactionOutbox:
+    """
+    Durable queue of rewards to mint, persisted in SQLite.
+    enqueue returns a tracking ID right away, and a worker thread signs, sends, retries and confirms the transactions.
+    The signed transaction and every fee-bumped replacement of the watchdog are written before they are sent,
+    so after a crash, a failed send or a timeout the latest version (same nonce) is sent again instead of minting the reward twice.
+    Whether the reward was minted is decided by the nonce: once the chain used it, the receipts of the journaled versions tell
+    whether one of them holds it, and a new transaction is only signed once the chain shows that the nonce is unused.
+    """
+
+    def __init__(self, contract, path: str, max_attempts: int = 3, poll_interval: float = 1.0):
+        if path != ":memory:" and os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.contract = contract
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        # The sent rewards to check by their nonce in the next round, e.g. after a failed send
+        self.retries = set()
+        self.thread = threading.Thread(target=self._run, name="transaction-outbox", daemon=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                tracking_id TEXT PRIMARY KEY,
+                to_address TEXT NOT NULL,
+                token_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                raw_transaction TEXT,
+                tx TEXT,
+                nonce INTEGER,
+                tx_hash TEXT,
+                token_id INTEGER NOT NULL DEFAULT -1,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, created_at);
+            CREATE TABLE IF NOT EXISTS outbox_transactions (
+                tx_hash TEXT PRIMARY KEY,
+                tracking_id TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_transactions_tracking_id ON outbox_transactions (tracking_id);
+            """
+        )
+
+    def start(self) -> None:
+        """
+        Resume the sent transactions of the previous runs and start sending the queued rewards.
+        """
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the worker. The rewards that are not confirmed yet are resumed by the next start.
+        """
+        self.stop_event.set()
+        self.wakeup.set()
+        self.thread.join()
+
+    def enqueue(self, to_address: str, token_name: str) -> str:
+        """
+        Queue a reward to mint and return its tracking ID.
+        """
+        tracking_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO outbox (tracking_id, to_address, token_name, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (tracking_id, to_address, token_name, now, now),
+            )
+        self.wakeup.set()
+        return tracking_id
+
+    def get_status(self, tracking_id: str) -> MintStatus | None:
+        """
+        Get the status of the queued reward, or None if the tracking ID is unknown.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT tracking_id, to_address, token_name, status, attempts, tx_hash, token_id, error FROM outbox WHERE tracking_id = ?",
+                (tracking_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return MintStatus(
+            tracking_id=row[0],
+            to_address=row[1],
+            token_name=row[2],
+            status=row[3],
+            attempts=row[4],
+            tx_hash=row[5],
+            token_id=row[6],
+            error=row[7],
+        )
+
+    def _update(self, tracking_id: str, **values) -> None:
+        columns = ", ".join(f"{column} = ?" for column in values)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"UPDATE outbox SET {columns}, updated_at = ? WHERE tracking_id = ?",
+                (*values.values(), time.time(), tracking_id),
+            )
+
+    def _run(self) -> None:
+        self._resume()
+        while not self.stop_event.is_set():
+            self.wakeup.clear()
+            try:
+                with self.lock:
+                    rows = self.conn.execute(
+                        "SELECT tracking_id, to_address, token_name, attempts FROM outbox WHERE status = 'queued' ORDER BY created_at"
+                    ).fetchall()
+            except Exception as e:
+                print(f"Error reading outbox: {e}")
+                rows = []
+            for tracking_id, to_address, token_name, attempts in rows:
+                if self.stop_event.is_set():
+                    return
+                self._handle(tracking_id, self._send, tracking_id, to_address, token_name, attempts)
+            with self.lock:
+                retries, self.retries = self.retries, set()
+            for tracking_id in retries:
+                if self.stop_event.is_set():
+                    return
+                self._handle(tracking_id, self._reconcile, tracking_id)
+            self.wakeup.wait(self.poll_interval)
+
+    def _resume(self) -> None:
+        # Check the journaled transactions of the previous runs by their nonce, and send the latest versions again
+        try:
+            with self.lock:
+                rows = self.conn.execute("SELECT tracking_id FROM outbox WHERE status = 'sent' ORDER BY created_at").fetchall()
+        except Exception as e:
+            print(f"Error reading outbox: {e}")
+            return
+        for (tracking_id,) in rows:
+            self._handle(tracking_id, self._reconcile, tracking_id)
+
+    def _handle(self, tracking_id: str, func, *args) -> None:
+        # One reward that cannot be handled must not stop the worker, so it is checked by its nonce in the next round
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Error handling reward {tracking_id}: {e}")
+            self._retry(tracking_id)
+
+    def _send(self, tracking_id: str, to_address: str, token_name: str, attempts: int) -> None:
+        try:
+            tx, raw_transaction = self.contract.sign_transaction(
+                self.contract.contract.functions.safeMint(to_address, token_name)
+            )
+        except Exception as e:
+            # Nothing was signed, so sign again until max_attempts
+            self._requeue(tracking_id, attempts + 1, str(e))
+            return
+
+        # Journal the signed transaction before sending it, in the same database transaction as its nonce
+        tx_hash = Web3.keccak(raw_transaction)
+        self._journal(tracking_id, tx, raw_transaction, tx_hash, status="sent", attempts=attempts + 1, nonce=tx["nonce"], error=None)
+        try:
+            self.contract.send_raw_transaction(
+                tx, raw_transaction, on_replace=lambda *version: self._journal(tracking_id, *version)
+            )
+        except Exception as e:
+            # The node may have accepted the transaction anyway, e.g. on a read timeout,
+            # so the journaled transaction is kept and checked by its nonce in the next round
+            self._update(tracking_id, error=str(e))
+            self._retry(tracking_id)
+            return
+        self._track(tracking_id, self.contract.track_receipt(tx_hash))
+
+    def _journal(self, tracking_id: str, tx: Dict, raw_transaction: HexBytes, tx_hash: HexBytes, **values) -> None:
+        # Write a version of the transaction before it is sent, the watchdog calls it for each replacement.
+        # The other values, e.g. the status and the nonce, are written in the same database transaction.
+        values = {"tx": json.dumps(tx), "raw_transaction": raw_transaction.to_0x_hex(), "tx_hash": tx_hash.to_0x_hex(), **values}
+        columns = ", ".join(f"{column} = ?" for column in values)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO outbox_transactions (tx_hash, tracking_id, created_at) VALUES (?, ?, ?)",
+                (tx_hash.to_0x_hex(), tracking_id, time.time()),
+            )
+            self.conn.execute(
+                f"UPDATE outbox SET {columns}, updated_at = ? WHERE tracking_id = ?",
+                (*values.values(), time.time(), tracking_id),
+            )
+
+    def _get_versions(self, tracking_id: str) -> List[HexBytes]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT tx_hash FROM outbox_transactions WHERE tracking_id = ? ORDER BY created_at", (tracking_id,)
+            ).fetchall()
+        return [HexBytes(tx_hash) for (tx_hash,) in rows]
+
+    def _finish(self, tracking_id: str, **values) -> None:
+        # The reward is confirmed or failed, so the journaled versions are not needed anymore
+        self._update(tracking_id, raw_transaction=None, tx=None, **values)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM outbox_transactions WHERE tracking_id = ?", (tracking_id,))
+
+    def _retry(self, tracking_id: str) -> None:
+        with self.lock:
+            self.retries.add(tracking_id)
+        self.wakeup.set()
+
+    def _requeue(self, tracking_id: str, attempts: int, error: str) -> None:
+        # Sign a new transaction until max_attempts
+        if attempts >= self.max_attempts:
+            self._finish(tracking_id, status="failed", attempts=attempts, error=error)
+            return
+        self._finish(tracking_id, status="queued", attempts=attempts, tx_hash=None, nonce=None, error=error)
+
+    def _reconcile(self, tracking_id: str) -> None:
+        # Decide by the nonce of the journaled transaction whether it was mined, or to send it again or sign a new one
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT attempts, raw_transaction, tx, nonce, tx_hash FROM outbox WHERE tracking_id = ? AND status = 'sent'",
+                (tracking_id,),
+            ).fetchone()
+        if row is None:
+            return
+        attempts, raw_transaction, tx, nonce, tx_hash = row
+        if tx is None or raw_transaction is None or tx_hash is None:
+            self._reconcile_unjournaled(tracking_id, attempts, nonce)
+            return
+        tx = json.loads(tx)
+        raw_transaction = HexBytes(raw_transaction)
+        tx_hash = HexBytes(tx_hash)
+        versions = self._get_versions(tracking_id)
+        replaced = [version for version in versions if version != tx_hash]
+        on_replace = lambda *version: self._journal(tracking_id, *version)
+        w3 = self.contract.w3
+        address = self.contract.account.address
+        try:
+            if w3.eth.get_transaction_count(address, "latest") > nonce:
+                # The nonce is used, so one of the versions was mined or another transaction took the nonce
+                tx_receipt = self._find_receipt(versions)
+                if tx_receipt is None:
+                    self._finish(tracking_id, status="failed", error=f"Nonce {nonce} was used by another transaction")
+                else:
+                    self._confirm_receipt(tracking_id, tx_receipt)
+                return
+            try:
+                self.contract.send_raw_transaction(tx, raw_transaction, on_replace=on_replace, replaced=replaced)
+                future = self.contract.track_receipt(tx_hash)
+            except Web3RPCError as e:
+                if w3.eth.get_transaction_count(address, "pending") > nonce:
+                    # The node already has a transaction with the nonce, e.g. one of the versions
+                    future = self.contract.watch_transaction(tx, tx_hash, on_replace=on_replace, replaced=replaced)
+                else:
+                    # The node rejected the transaction and the nonce is unused, so it is safe to sign a new one
+                    self._requeue(tracking_id, attempts, str(e))
+                    return
+            self._track(tracking_id, future)
+        except Exception as e:
+            # The node is not reachable, try again in the next round
+            print(f"Error sending transaction {tx_hash.to_0x_hex()} again: {e}")
+            self._update(tracking_id, error=str(e))
+            self._retry(tracking_id)
+
+    def _reconcile_unjournaled(self, tracking_id: str, attempts: int, nonce: int | None) -> None:
+        # The reward is sent but no version of its transaction is journaled, e.g. it was written by an older version
+        # or the process stopped in between, so nothing was sent unless one of the versions holds the nonce
+        w3 = self.contract.w3
+        address = self.contract.account.address
+        try:
+            if nonce is not None and w3.eth.get_transaction_count(address, "latest") > nonce:
+                tx_receipt = self._find_receipt(self._get_versions(tracking_id))
+                if tx_receipt is not None:
+                    self._confirm_receipt(tracking_id, tx_receipt)
+                    return
+        except Exception as e:
+            # The node is not reachable, try again in the next round
+            print(f"Error checking nonce {nonce}: {e}")
+            self._update(tracking_id, error=str(e))
+            self._retry(tracking_id)
+            return
+        # The transaction of the reward was not sent, so it is safe to sign a new one
+        self._requeue(tracking_id, attempts, "The transaction was not journaled")
+
+    def _find_receipt(self, tx_hashes: List[HexBytes]):
+        for tx_hash in tx_hashes:
+            try:
+                return self.contract.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    def _track(self, tracking_id: str, future: Future) -> None:
+        future.add_done_callback(lambda future: self._confirm(tracking_id, future))
+
+    def _confirm(self, tracking_id: str, future: Future) -> None:
+        try:
+            tx_receipt = future.result()
+        except TimeExhausted as e:
+            # The transaction can still be mined, so check its nonce instead of giving up
+            print(f"Error waiting for transaction: {e}")
+            self._retry(tracking_id)
+            return
+        except Exception as e:
+            self._finish(tracking_id, status="failed", error=f"Error waiting for transaction: {e}")
+            return
+        self._confirm_receipt(tracking_id, tx_receipt)
+
+    def _confirm_receipt(self, tracking_id: str, tx_receipt) -> None:
+        # The receipt may be the one of a replacement sent by the watchdog
+        tx_hash = tx_receipt["transactionHash"].to_0x_hex()
+        if tx_receipt["status"] != 1:
+            self._finish(tracking_id, status="failed", tx_hash=tx_hash, error=f"Transaction {tx_hash} reverted")
+            return
+        try:
+            self.contract.apply_receipt(tx_receipt)
+        except Exception as e:
+            print(f"Error applying receipt of transaction {tx_hash}: {e}")
+        token_id = int(tx_receipt["logs"][0]["topics"][3].hex(), 16)
+        self._finish(tracking_id, status="confirmed", tx_hash=tx_hash, token_id=token_id)
@@ -0,0 +1,102 @@
+import math
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable
+from hexbytes import HexBytes
+from web3 import Web3
+
+class TransactionWatchdog:
+    """
+    Replace the transactions that stay pending longer than stuck_after seconds.
+    A stuck transaction is signed again with the same nonce and fees bumped by at least fee_bump times,
+    and the receipt tracker follows every version, so its future resolves to the receipt of whichever version is mined.
+    Each replacement is passed to the on_replace callback of the transaction before it is sent, so it can be persisted.
+    The thread starts when a transaction is watched and stops when nothing is pending.
+    """
+
+    def __init__(self, w3, account, receipts, fees, stuck_after: float = 30.0, fee_bump: float = 1.125, max_bumps: int = 5):
+        self.w3 = w3
+        self.account = account
+        self.receipts = receipts
+        self.fees = fees
+        self.stuck_after = stuck_after
+        self.fee_bump = fee_bump
+        self.max_bumps = max_bumps
+        self.lock = threading.Lock()
+        self.entries: Dict[int, Dict] = {}
+        self.thread = None
+
+    def watch(
+        self,
+        tx: Dict,
+        tx_hash: HexBytes,
+        on_replace: Callable[[Dict, HexBytes, HexBytes], None] | None = None,
+        replaced: Iterable[HexBytes] = (),
+    ) -> Future:
+        """
+        Follow the sent transaction until it is mined and get the future of its receipt.
+        on_replace is called with the transaction, the raw transaction and the hash of each replacement before it is sent,
+        and the previous versions in replaced are followed too, e.g. the ones journaled before a restart.
+        """
+        future = self.receipts.track(tx_hash)
+        for old_tx_hash in replaced:
+            self.receipts.replace(tx_hash, old_tx_hash)
+        nonce = tx["nonce"]
+        with self.lock:
+            self.entries[nonce] = {
+                "tx": tx,
+                "tx_hash": tx_hash,
+                "sent_at": time.monotonic(),
+                "bumps": 0,
+                "future": future,
+                "on_replace": on_replace,
+            }
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="transaction-watchdog", daemon=True)
+                self.thread.start()
+        future.add_done_callback(lambda _: self._forget(nonce, future))
+        return future
+
+    def _forget(self, nonce: int, future: Future) -> None:
+        with self.lock:
+            entry = self.entries.get(nonce)
+            if entry is not None and entry["future"] is future:
+                del self.entries[nonce]
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(min(1.0, self.stuck_after))
+            now = time.monotonic()
+            with self.lock:
+                if len(self.entries) == 0:
+                    self.thread = None
+                    return
+                stuck = [
+                    (nonce, entry)
+                    for nonce, entry in self.entries.items()
+                    if now - entry["sent_at"] >= self.stuck_after and entry["bumps"] < self.max_bumps
+                ]
+            for nonce, entry in stuck:
+                try:
+                    self._replace(entry)
+                except Exception as e:
+                    # The transaction may have been mined meanwhile, so wait for another deadline before retrying
+                    print(f"Error replacing transaction with nonce {nonce}: {e}")
+                    entry["sent_at"] = time.monotonic()
+
+    def _replace(self, entry: Dict) -> None:
+        # Bump both fees enough for the node to accept the replacement, and at least to the current market
+        tx = dict(entry["tx"])
+        max_fee, priority_fee = self.fees.get_fees()
+        tx["maxPriorityFeePerGas"] = max(math.ceil(tx["maxPriorityFeePerGas"] * self.fee_bump), priority_fee)
+        tx["maxFeePerGas"] = max(math.ceil(tx["maxFeePerGas"] * self.fee_bump), max_fee, tx["maxPriorityFeePerGas"])
+
+        signed_tx = self.account.sign_transaction(tx)
+        new_tx_hash = Web3.keccak(signed_tx.raw_transaction)
+        if entry["on_replace"] is not None:
+            # Persist the replacement before sending it, so it is not lost if the process stops
+            entry["on_replace"](tx, signed_tx.raw_transaction, new_tx_hash)
+        self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        self.receipts.replace(entry["tx_hash"], new_tx_hash)
+        entry.update(tx=tx, tx_hash=new_tx_hash, sent_at=time.monotonic(), bumps=entry["bumps"] + 1)